@@ -3,6 +3,7 @@
 添加：对比模式、信息茧房模拟、预设场景、数据查看
 """
 
+import functools
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -14,6 +15,110 @@ st.set_page_config(page_title="新闻推荐算法演示系统", page_icon="📰"
 if 'data_loaded' not in st.session_state:
     st.session_state.data_loaded = False
 
+@st.cache_resource
+def get_model_cache():
+    """进程级模型缓存，所有会话与标签页共享"""
+    return ModelCache(max_entries=4)
+
+@st.cache_resource
+def get_recommendation_cache():
+    """进程级推荐结果缓存，按模型版本区分，所有会话共享"""
+    return RecommendationCache(max_entries=10000, max_bytes=64 << 20)
+
+def current_model():
+    """当前数据与所选算法对应的推荐模型（按数据指纹从缓存中获取，数据不变时不会重复构建）"""
+    if 'data_fingerprint' not in st.session_state:
+        st.session_state.data_fingerprint = dataset_fingerprint(
+            st.session_state.users_df,
+            st.session_state.news_df,
+            st.session_state.behaviors_df
+        )
+    return get_model_cache().get(
+        st.session_state.users_df,
+        st.session_state.news_df,
+        st.session_state.behaviors_df,
+        fingerprint=st.session_state.data_fingerprint,
+        algorithm=st.session_state.get('algorithm', 'user_cf'),
+        matrix=st.session_state.get('user_item_matrix')
+    )
+
+@st.cache_resource
+def get_model_holder():
+    """进程级模型持有者：后台重建数据与模型，所有会话同步到它的当前版本"""
+    return ModelHolder(model_cache=get_model_cache())
+
+def load_scenario(scenario, progress):
+    """后台加载预设场景：内存映射加载场景快照（含矩阵与近邻索引），快照不存在或生成代码变化时重建"""
+    return scenario_snapshot(scenario, progress=progress)
+
+def generate_new_dataset(progress):
+    """后台生成新数据并保存"""
+    progress(0.0, "正在生成数据...")
+    users_df, news_df, behaviors_df = generate_dataset()
+    progress(0.5, "正在保存数据...")
+    save_dataset(users_df, news_df, behaviors_df)
+    save_dataset_binary(users_df, news_df, behaviors_df, source=csv_state())
+    return users_df, news_df, behaviors_df
+
+def import_dataset(progress):
+    """后台导入数据：CSV 自上次写入二进制数据以来没有变化时内存映射加载二进制数据，
+    否则分块读取 CSV（同时构建用户-物品矩阵并重写二进制数据）
+    """
+    progress(0.0, "正在读取数据...")
+    if binary_is_current():
+        users_df, news_df, behaviors_df = load_dataset_binary()
+        if users_df is not None:
+            return users_df, news_df, behaviors_df
+    users_df, news_df, behaviors_df, matrix = load_dataset_chunked(
+        progress=lambda rows, done, total: progress(min(done / max(total, 1), 1.0), f"已读取 {rows:,} 条行为")
+    )
+    if users_df is None:
+        return None
+    return users_df, news_df, behaviors_df, matrix
+
+def sync_dataset():
+    """把本会话的数据切换到模型持有者的当前版本（其他会话触发的重建也会同步过来）"""
+    current = get_model_holder().current
+    if current is None or st.session_state.get('data_version') == current.version:
+        return
+    st.session_state.users_df = current.users_df
+    st.session_state.news_df = current.news_df
+    st.session_state.behaviors_df = current.behaviors_df
+    st.session_state.data_fingerprint = current.fingerprint
+    st.session_state.user_item_matrix = current.matrix
+    st.session_state.pop('candidate_index', None)
+    st.session_state.data_version = current.version
+    st.session_state.data_loaded = True
+
+def build_status():
+    """数据版本与后台构建进度；构建中每秒刷新，空闲时定期检查其他会话触发的新版本"""
+    holder = get_model_holder()
+    building = holder.building
+
+    @st.fragment(run_every=1.0 if building else 5.0)
+    def show():
+        status = holder.status()
+        # 新版本就绪或构建开始/结束时整页重跑：同步数据并切换刷新频率
+        if holder.version != st.session_state.get('data_version', 0) or status['building'] != building:
+            st.rerun()
+        current = holder.current
+        if current is not None:
+            st.caption(f"数据版本 v{current.version}（{current.label}）")
+        if status['building']:
+            st.progress(status['fraction'], text=f"后台构建：{status['label']} - {status['message']}")
+        elif status['error']:
+            st.error(f"❌ {status['label']} 失败：{status['error']}")
+
+    show()
+
+def current_candidate_index():
+    """当前新闻数据的候选集索引（数据变化时重建）"""
+    if 'candidate_index' not in st.session_state:
+        st.session_state.candidate_index = CandidateIndex(st.session_state.news_df)
+    return st.session_state.candidate_index
+
+sync_dataset()
+
 # ========== 侧边栏：数据管理 ==========
 with st.sidebar:
     st.header("📊 数据管理")
@@ -27,6 +132,29 @@ with st.sidebar:
     else:
         st.warning("⚠️ 暂无数据")
     
+    # 性能面板：记录各计算阶段的耗时（进程级开关，关闭时不计时）
+    # 只在本会话拨动开关时写入全局状态，开关初值取当前全局状态，避免每次重跑覆盖其他会话的设置
+    with st.expander("⏱️ 性能"):
+        perf_on = st.toggle("记录各阶段耗时", value=PERF.enabled, key="perf_enabled",
+                            on_change=lambda: enable_perf(st.session_state.perf_enabled))
+        if perf_on:
+            perf_summary = PERF.summary()
+            if perf_summary.empty:
+                st.caption("暂无记录，操作后显示")
+            else:
+                st.dataframe(perf_summary, use_container_width=True, hide_index=True)
+                st.download_button(
+                    "💾 导出耗时记录",
+                    PERF.to_frame().to_csv(index=False),
+                    file_name="perf_records.csv",
+                    use_container_width=True
+                )
+                if st.button("🧹 清空记录", use_container_width=True):
+                    PERF.reset()
+                    st.rerun()
+        rec_stats = get_recommendation_cache().stats()
+        st.caption(f"推荐结果缓存：{rec_stats['entries']} 条，命中率 {rec_stats['hit_rate']:.0%}")
+    
     st.markdown("---")
     
     # 预设场景
@@ -40,41 +168,21 @@ with st.sidebar:
     
     if st.button("🚀 加载场景", use_container_width=True):
         if scenario != "请选择":
-            with st.spinner("正在生成场景数据..."):
-                users_df, news_df, behaviors_df = generate_scenario(scenario)
-                save_dataset(users_df, news_df, behaviors_df)
-                st.session_state.users_df = users_df
-                st.session_state.news_df = news_df
-                st.session_state.behaviors_df = behaviors_df
-                st.session_state.data_loaded = True
-                st.success(f"✅ {scenario} 加载成功！")
-                st.rerun()
+            get_model_holder().submit(functools.partial(load_scenario, scenario), label=scenario)
+            st.rerun()
     
     st.markdown("---")
     
     # 原有按钮
     if st.button("🔄 生成新数据", use_container_width=True):
-        with st.spinner("正在生成数据..."):
-            users_df, news_df, behaviors_df = generate_dataset()
-            save_dataset(users_df, news_df, behaviors_df)
-            st.session_state.users_df = users_df
-            st.session_state.news_df = news_df
-            st.session_state.behaviors_df = behaviors_df
-            st.session_state.data_loaded = True
-            st.success("✅ 数据生成成功！")
-            st.rerun()
+        get_model_holder().submit(generate_new_dataset, label="新数据")
+        st.rerun()
     
     if st.button("📂 导入数据", use_container_width=True):
-        users_df, news_df, behaviors_df = load_dataset()
-        if users_df is not None:
-            st.session_state.users_df = users_df
-            st.session_state.news_df = news_df
-            st.session_state.behaviors_df = behaviors_df
-            st.session_state.data_loaded = True
-            st.success("✅ 数据导入成功！")
-            st.rerun()
-        else:
-            st.error("❌ 未找到数据文件！")
+        get_model_holder().submit(import_dataset, label="导入数据")
+        st.rerun()
+    
+    build_status()
 
 # ========== 主界面 ==========
 st.title("🎯 新闻推荐算法演示系统")
@@ -84,10 +192,19 @@ if not st.session_state.data_loaded:
     st.info("👈 请先在侧边栏加载预设场景或生成数据")
 else:
     # 功能选择（添加第4个标签页）
+    # 推荐算法选择，对所有标签页生效
+    st.radio(
+        "推荐算法",
+        list(ALGORITHM_NAMES),
+        format_func=ALGORITHM_NAMES.get,
+        horizontal=True,
+        key="algorithm"
+    )
+    
     tab1, tab2, tab3, tab4 = st.tabs(["🔍 单用户推荐", "⚖️ 对比模式", "🕸️ 信息茧房模拟", "📋 查看数据"])
     
     # ========== Tab1: 单用户推荐 ==========
-    with tab1:
+    with tab1, perf_stage("页面：单用户推荐"):
         st.header("🔍 单用户推荐演示")
         
         col1, col2 = st.columns([1, 2])
@@ -95,27 +212,41 @@ else:
         with col1:
             user_id = st.number_input("请输入用户ID", min_value=1, max_value=100, value=5)
             
+            # 候选集预筛选：只在近期发布、用户兴趣类别内（另加少量探索）的新闻中排序
+            with st.expander("🎯 候选集预筛选"):
+                use_candidates = st.toggle("启用候选集", key="use_candidates")
+                window_days = st.slider("只看最近几天发布的新闻", min_value=1, max_value=31, value=7,
+                                        key="candidate_window")
+                by_interest = st.checkbox("只看兴趣类别", value=True, key="candidate_by_interest")
+                explore = st.number_input("探索条数（兴趣以外）", min_value=0, max_value=100, value=5,
+                                          key="candidate_explore")
+            
             if st.button("🚀 开始推荐", type="primary", use_container_width=True):
                 with st.spinner("正在计算..."):
-                    matrix = build_user_item_matrix(
-                        st.session_state.users_df,
-                        st.session_state.news_df,
-                        st.session_state.behaviors_df
-                    )
-                    similarity = calculate_user_similarity(matrix)
-                    similar_users, recommendations = recommend_for_user(
-                        user_id, similarity, matrix, st.session_state.news_df
+                    candidates = None
+                    if use_candidates:
+                        candidates = current_candidate_index().candidates(
+                            interests=user_interests(st.session_state.users_df, user_id) if by_interest else None,
+                            window=window_days * 86400,
+                            explore=explore,
+                            seed=user_id
+                        )
+                    similar_users, recommendations = get_recommendation_cache().get(
+                        current_model(), user_id, st.session_state.news_df, candidates=candidates,
+                        candidates_key=(window_days, by_interest, explore) if use_candidates else None
                     )
                     st.session_state.similar_users = similar_users
                     st.session_state.recommendations = recommendations
         
         with col2:
             if 'recommendations' in st.session_state:
-                st.subheader("📋 相似用户")
-                for uid, sim in st.session_state.similar_users:
-                    st.write(f"• 用户{uid} - 相似度: {sim:.2f}")
-                
-                st.markdown("---")
+                # 物品协同过滤没有相似用户
+                if st.session_state.similar_users:
+                    st.subheader("📋 相似用户")
+                    for uid, sim in st.session_state.similar_users:
+                        st.write(f"• 用户{uid} - 相似度: {sim:.2f}")
+                    
+                    st.markdown("---")
                 
                 st.subheader("📰 推荐结果")
                 for i, (news_id, title, category, reason) in enumerate(st.session_state.recommendations, 1):
@@ -125,7 +256,7 @@ else:
                     """)
     
     # ========== Tab2: 对比模式 ==========
-    with tab2:
+    with tab2, perf_stage("页面：对比模式"):
         st.header("⚖️ 对比两个用户的推荐差异")
         
         col1, col2 = st.columns(2)
@@ -138,15 +269,12 @@ else:
         
         if st.button("🔄 开始对比", type="primary", use_container_width=True):
             with st.spinner("正在计算对比结果..."):
-                matrix = build_user_item_matrix(
-                    st.session_state.users_df,
-                    st.session_state.news_df,
-                    st.session_state.behaviors_df
-                )
-                similarity = calculate_user_similarity(matrix)
+                # 两个用户共用同一个模型
+                model = current_model()
                 
-                similar_a, rec_a = recommend_for_user(user_a, similarity, matrix, st.session_state.news_df)
-                similar_b, rec_b = recommend_for_user(user_b, similarity, matrix, st.session_state.news_df)
+                cache = get_recommendation_cache()
+                similar_a, rec_a = cache.get(model, user_a, st.session_state.news_df)
+                similar_b, rec_b = cache.get(model, user_b, st.session_state.news_df)
                 
                 st.session_state.compare_a = (user_a, rec_a)
                 st.session_state.compare_b = (user_b, rec_b)
@@ -182,40 +310,77 @@ else:
                 st.warning("⚠️ 两个用户的推荐结果完全不同！这就是个性化推荐。")
     
     # ========== Tab3: 信息茧房模拟 ==========
-    with tab3:
+    with tab3, perf_stage("页面：信息茧房模拟"):
         st.header("🕸️ 信息茧房形成过程模拟")
         st.info("模拟用户持续点击推荐内容，观察推荐如何越来越集中")
         
-        user_id_sim = st.number_input("选择用户ID", min_value=1, max_value=100, value=5, key="sim_user")
-        iterations = st.slider("模拟次数", min_value=3, max_value=10, value=5)
+        sim_mode = st.radio("模拟对象", ["单用户", "全体用户"], horizontal=True, key="sim_mode")
         
-        if st.button("▶️ 开始模拟", type="primary"):
-            with st.spinner("正在模拟..."):
-                results = simulate_echo_chamber(
-                    user_id_sim,
-                    st.session_state.users_df,
-                    st.session_state.news_df,
-                    st.session_state.behaviors_df,
-                    iterations
-                )
-                st.session_state.sim_results = results
+        if sim_mode == "单用户":
+            user_id_sim = st.number_input("选择用户ID", min_value=1, max_value=100, value=5, key="sim_user")
+            iterations = st.slider("模拟次数", min_value=3, max_value=10, value=5)
+            
+            if st.button("▶️ 开始模拟", type="primary"):
+                with st.spinner("正在模拟..."):
+                    results = simulate_echo_chamber(
+                        user_id_sim,
+                        st.session_state.users_df,
+                        st.session_state.news_df,
+                        st.session_state.behaviors_df,
+                        iterations,
+                        model=current_model()
+                    )
+                    st.session_state.sim_results = results
+            
+            if 'sim_results' in st.session_state:
+                st.markdown("---")
+                st.subheader("📈 茧房形成过程")
+                
+                for i, (iter_num, category_dist, top_rec) in enumerate(st.session_state.sim_results):
+                    with st.expander(f"第 {iter_num} 次推荐", expanded=(i == 0 or i == len(st.session_state.sim_results) - 1)):
+                        st.write("**类别分布**:")
+                        for cat, pct in category_dist.items():
+                            st.progress(pct / 100, text=f"{cat}: {pct}%")
+                        st.write(f"**用户点击**: {top_rec}")
+                
+                st.markdown("---")
+                st.warning("⚠️ **观察**: 推荐内容越来越集中在用户感兴趣的类别，这就是信息茧房的形成过程！")
         
-        if 'sim_results' in st.session_state:
-            st.markdown("---")
-            st.subheader("📈 茧房形成过程")
+        else:
+            # 全体用户：每轮所有用户（或抽样人群）各点击一次推荐列表的第一条
+            n_users_total = len(st.session_state.users_df)
+            col1, col2 = st.columns(2)
+            with col1:
+                rounds = st.slider("模拟轮数", min_value=5, max_value=50, value=20, key="pop_rounds")
+            with col2:
+                cohort_size = st.slider("参与用户数", min_value=1, max_value=n_users_total,
+                                        value=n_users_total, key="pop_cohort")
             
-            for i, (iter_num, category_dist, top_rec) in enumerate(st.session_state.sim_results):
-                with st.expander(f"第 {iter_num} 次推荐", expanded=(i == 0 or i == len(st.session_state.sim_results) - 1)):
-                    st.write("**类别分布**:")
-                    for cat, pct in category_dist.items():
-                        st.progress(pct / 100, text=f"{cat}: {pct}%")
-                    st.write(f"**用户点击**: {top_rec}")
+            if st.button("▶️ 开始群体模拟", type="primary"):
+                with st.spinner("正在模拟..."):
+                    st.session_state.pop_results = simulate_population(
+                        st.session_state.users_df,
+                        st.session_state.news_df,
+                        st.session_state.behaviors_df,
+                        rounds=rounds,
+                        cohort=None if cohort_size == n_users_total else cohort_size,
+                        algorithm=st.session_state.get('algorithm', 'user_cf')
+                    )
             
-            st.markdown("---")
-            st.warning("⚠️ **观察**: 推荐内容越来越集中在用户感兴趣的类别，这就是信息茧房的形成过程！")
+            if 'pop_results' in st.session_state:
+                pop_results = st.session_state.pop_results.set_index('轮次')
+                st.markdown("---")
+                st.subheader("📈 各类别平均占比（%）")
+                st.line_chart(pop_results.drop(columns='集中度'))
+                st.subheader("📈 推荐集中度（HHI，越大越集中）")
+                st.line_chart(pop_results['集中度'])
+                
+                first, last = pop_results['集中度'].iloc[0], pop_results['集中度'].iloc[-1]
+                st.metric("集中度变化", f"{last:.3f}", f"{last - first:+.3f}")
+                st.warning("⚠️ **观察**: 集中度上升说明整个用户群体的推荐在向少数类别收敛！")
     
     # ========== Tab4: 查看数据 ==========
-    with tab4:
+    with tab4, perf_stage("页面：查看数据"):
         st.header("📋 数据总览")
         
         data_view = st.selectbox("选择查看", ["用户数据", "新闻数据", "行为数据", "数据统计"])
@@ -0,0 +1,297 @@
+"""
+性能基准测试
+按用户数 × 行为数逐级放大，记录数据生成、存取、建矩阵、相似度、推荐、各算法训练、信息茧房模拟各阶段的耗时与峰值内存，
+结果写成 JSON，可与历史结果对比发现性能回退。
+
+用法：
+    python benchmark.py                                  # 完整扫描：用户 1e2~1e5，行为 1e3~1e7
+    python benchmark.py --users 100 1000 --behaviors 1000 10000 --output bench.json
+    python benchmark.py --baseline old.json --tolerance 0.2   # 与历史结果对比
+    python benchmark.py --users 5000 --news 20000 --behaviors 100000 1000000 4000000 \
+        --skip csv binary blocked simulate                    # 流式接入吞吐不应随历史规模下降
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import scipy
+import sklearn
+
+from utils import *
+
+DEFAULT_USERS = [100, 1000, 10000, 100000]
+DEFAULT_BEHAVIORS = [1000, 10000, 100000, 1000000, 10000000]
+
+# 超过该用户数时不再计算完整的 U×U 稠密相似度（1e5 用户需要约 40GB）
+DENSE_SIMILARITY_LIMIT = 20000
+
+# 分块落盘的精确相似度占用 U²×4 字节磁盘，超过该用户数时跳过（5e4 用户约 10GB）
+BLOCKED_SIMILARITY_LIMIT = 50000
+
+def measure(fn, repeat=1, trace_memory=True):
+    """执行 fn：计时取 repeat 次中的最好成绩，另跑一次 tracemalloc 记录峰值内存
+
+    返回 (秒数, 峰值字节数或 None, fn 的返回值)
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak = None
+    if trace_memory:
+        result = None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best, peak, result
+
+def run_case(n_users, n_news, n_behaviors, args, workdir):
+    """跑一组规模下的全部阶段，返回结果记录列表"""
+    records = []
+    skip = set(args.skip)
+
+    def record(stage, fn, **extra):
+        seconds, peak, result = measure(fn, args.repeat, not args.no_memory)
+        records.append({
+            'users': n_users,
+            'news': n_news,
+            'behaviors': n_behaviors,
+            'stage': stage,
+            'seconds': seconds,
+            'peak_mb': None if peak is None else peak / 1e6,
+            **extra
+        })
+        mem = '' if peak is None else f"  峰值 {peak / 1e6:9.1f} MB"
+        print(f"  {stage:<26} {seconds:9.4f} s{mem}", flush=True)
+        return result
+
+    print(f"用户 {n_users}  新闻 {n_news}  行为 {n_behaviors}", flush=True)
+    users_df, news_df, behaviors_df = record(
+        'generate_scenario',
+        lambda: generate_scenario(args.scenario, seed=args.seed, n_users=n_users,
+                                  n_news=n_news, n_behaviors=n_behaviors)
+    )
+
+    # 存取：CSV 写到临时目录，避免覆盖工作目录下的数据文件
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        if 'csv' not in skip:
+            record('save_dataset', lambda: save_dataset(users_df, news_df, behaviors_df))
+            record('load_dataset', load_dataset)
+            record('load_interaction_matrix',
+                   lambda: load_interaction_matrix(users_df, news_df, chunk_size=args.chunk_size),
+                   chunk_size=args.chunk_size)
+        if 'binary' not in skip:
+            record('save_dataset_binary', lambda: save_dataset_binary(users_df, news_df, behaviors_df))
+            record('load_dataset_binary', load_dataset_binary)
+    finally:
+        os.chdir(cwd)
+
+    matrix = record('build_user_item_matrix',
+                    lambda: build_user_item_matrix(users_df, news_df, behaviors_df))
+    records[-1]['nnz'] = int(matrix.nnz)
+
+    if n_users <= args.dense_limit:
+        record('calculate_user_similarity', lambda: calculate_user_similarity(matrix))
+    if 'blocked' not in skip and n_users <= args.blocked_limit:
+        # 每次写到新的子目录，避免命中上一次的断点续算
+        record('blocked_similarity',
+               lambda: blocked_similarity(matrix, tempfile.mkdtemp(dir=workdir), n_workers=args.threads),
+               threads=args.threads)
+    neighbors = record('neighbor_index',
+                       lambda: calculate_user_similarity(matrix, k=DEFAULT_NEIGHBORS),
+                       k=DEFAULT_NEIGHBORS)
+
+    # 单用户推荐取固定的一批用户，同时记录平均单次耗时
+    rng = np.random.default_rng(args.seed)
+    sample = rng.integers(1, n_users + 1, size=min(args.queries, n_users))
+    record('recommend_for_user',
+           lambda: [recommend_for_user(int(uid), neighbors, matrix, news_df) for uid in sample],
+           queries=len(sample))
+    records[-1]['per_call_ms'] = records[-1]['seconds'] / len(sample) * 1000
+    # 候选集预筛选：近 7 天、用户兴趣类别内，外加 5 条探索
+    candidate_index = CandidateIndex(news_df)
+    interests = user_interests(users_df, sample)
+    record('recommend_candidates',
+           lambda: [recommend_for_user(int(uid), neighbors, matrix, news_df,
+                                       candidates=candidate_index.candidates(list(cats), window=7 * 86400,
+                                                                             explore=5, seed=args.seed))
+                    for uid, cats in zip(sample, interests)],
+           queries=len(sample))
+    records[-1]['per_call_ms'] = records[-1]['seconds'] / len(sample) * 1000
+    record('recommend_for_users',
+           lambda: recommend_for_users(np.arange(1, n_users + 1), neighbors, matrix, news_df),
+           queries=n_users)
+
+    # 其他推荐算法：训练（构建模型）与全量批量推荐
+    for algorithm in args.algorithms:
+        model = record(f'train_{algorithm}', lambda: build_model(matrix, algorithm))
+        records[-1]['model_mb'] = model.nbytes / 1e6
+        record(f'recommend_users_{algorithm}',
+               lambda: model.recommend_users(np.arange(1, n_users + 1), news_df),
+               queries=n_users)
+
+    if 'ingest' not in skip:
+        # 流式接入：前面的行为建模，最后 ingest_events 条按批回放（每次在模型副本上回放）
+        n_events = min(args.ingest_events, len(behaviors_df) // 2)
+        history, replay = behaviors_df.iloc[:-n_events], behaviors_df.iloc[-n_events:]
+        for algorithm in args.ingest_algorithms:
+            base = BehaviorStream.from_frames(users_df, news_df, history, algorithm=algorithm)
+
+            def ingest():
+                stream = BehaviorStream(base.model.copy(), log=EventLog(len(replay)))
+                for start in range(0, n_events, args.batch_size):
+                    stream.ingest(replay.iloc[start:start + args.batch_size])
+                return stream
+
+            record(f'ingest_stream_{algorithm}', ingest, events=n_events, batch_size=args.batch_size)
+            records[-1]['events_per_s'] = n_events / records[-1]['seconds'] if records[-1]['seconds'] else None
+
+    if 'simulate' not in skip:
+        model = UserCFModel(matrix)
+        record('simulate_echo_chamber',
+               lambda: simulate_echo_chamber(int(sample[0]), users_df, news_df, behaviors_df,
+                                             iterations=args.iterations, model=model),
+               iterations=args.iterations)
+        record('simulate_population',
+               lambda: simulate_population(users_df, news_df, behaviors_df, rounds=args.iterations,
+                                           cohort=min(args.cohort, n_users), n_workers=args.workers),
+               iterations=args.iterations, cohort=min(args.cohort, n_users))
+    return records
+
+def compare(results, baseline, tolerance, min_seconds=0.05):
+    """与历史结果逐阶段对比，返回变慢超过 tolerance 比例的条目（两次都短于 min_seconds 的阶段视为噪声）"""
+    key = lambda r: (r['users'], r['news'], r['behaviors'], r['stage'])
+    old = {key(r): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        prev = old.get(key(r))
+        if prev is None or max(prev['seconds'], r['seconds']) < min_seconds:
+            continue
+        if r['seconds'] > prev['seconds'] * (1 + tolerance):
+            regressions.append((r, prev))
+    return regressions
+
+def ingest_scaling(results, tolerance, min_seconds=0.05):
+    """流式接入吞吐随历史规模的变化：同一用户数、同一算法下，最大历史规模的 events_per_s
+    低于最小历史规模的 (1 - tolerance) 倍时记为下降，返回 (最小规模记录, 最大规模记录) 列表
+    """
+    runs = {}
+    for r in results:
+        if r['stage'].startswith('ingest_stream') and r.get('events_per_s'):
+            runs.setdefault((r['users'], r['stage']), []).append(r)
+    drops = []
+    for group in runs.values():
+        first = min(group, key=lambda r: r['behaviors'])
+        last = max(group, key=lambda r: r['behaviors'])
+        if first is last or min(first['seconds'], last['seconds']) < min_seconds:
+            continue
+        if last['events_per_s'] < first['events_per_s'] * (1 - tolerance):
+            drops.append((first, last))
+    return drops
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="新闻推荐流水线性能基准测试")
+    parser.add_argument('--users', type=int, nargs='+', default=DEFAULT_USERS, help="用户数列表")
+    parser.add_argument('--behaviors', type=int, nargs='+', default=DEFAULT_BEHAVIORS, help="行为数列表")
+    parser.add_argument('--news', type=int, default=500, help="新闻数")
+    parser.add_argument('--scenario', default="场景2: 综合媒体", help="生成数据使用的场景")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=1, help="计时重复次数（取最好成绩）")
+    parser.add_argument('--queries', type=int, default=100, help="单用户推荐的调用次数")
+    parser.add_argument('--iterations', type=int, default=10, help="信息茧房模拟步数")
+    parser.add_argument('--cohort', type=int, default=1000, help="群体模拟的抽样用户数")
+    parser.add_argument('--workers', type=int, default=1, help="群体模拟的进程数")
+    parser.add_argument('--dense-limit', type=int, default=DENSE_SIMILARITY_LIMIT,
+                        help="超过该用户数跳过完整稠密相似度")
+    parser.add_argument('--blocked-limit', type=int, default=BLOCKED_SIMILARITY_LIMIT,
+                        help="超过该用户数跳过分块落盘的精确相似度")
+    parser.add_argument('--threads', type=int, default=None, help="分块相似度的线程数（默认 CPU 核数）")
+    parser.add_argument('--algorithms', nargs='*', default=['item_cf', 'als'], choices=list(ALGORITHMS),
+                        help="额外测试训练与批量推荐的算法（用户协同过滤已由上面的阶段覆盖）")
+    parser.add_argument('--chunk-size', type=int, default=CSV_CHUNK_SIZE, help="分块读取行为 CSV 的行数")
+    parser.add_argument('--ingest-events', type=int, default=10000, help="流式接入回放的行为数")
+    parser.add_argument('--batch-size', type=int, default=1000, help="流式接入每批的行为数")
+    parser.add_argument('--ingest-algorithms', nargs='*', default=list(ALGORITHMS), choices=list(ALGORITHMS),
+                        help="测试流式接入的算法")
+    parser.add_argument('--ingest-tolerance', type=float, default=0.5,
+                        help="流式接入吞吐从最小到最大历史规模允许下降的比例")
+    parser.add_argument('--skip', nargs='*', default=[], choices=['csv', 'binary', 'blocked', 'ingest', 'simulate'],
+                        help="跳过的阶段")
+    parser.add_argument('--no-memory', action='store_true', help="不记录峰值内存")
+    parser.add_argument('--output', default=None, help="结果 JSON 路径（默认按时间命名）")
+    parser.add_argument('--baseline', default=None, help="用于对比的历史结果 JSON")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="判定回退的变慢比例")
+    parser.add_argument('--min-seconds', type=float, default=0.05, help="对比时忽略短于该时长的阶段")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_users in args.users:
+            for n_behaviors in args.behaviors:
+                # 行为数少于用户数的组合没有意义
+                if n_behaviors < n_users:
+                    continue
+                results.extend(run_case(n_users, args.news, n_behaviors, args, workdir))
+
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'scipy': scipy.__version__,
+            'scikit-learn': sklearn.__version__,
+            'args': vars(args),
+        },
+        'results': results,
+    }
+    output = args.output or f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
+
+    status = 0
+    for first, last in ingest_scaling(results, args.ingest_tolerance, args.min_seconds):
+        print(f"⚠️ 接入吞吐随历史下降: 用户 {first['users']} {first['stage']}: "
+              f"行为 {first['behaviors']} {first['events_per_s']:.0f} 条/s -> "
+              f"行为 {last['behaviors']} {last['events_per_s']:.0f} 条/s")
+        status = 1
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.min_seconds)
+        for r, prev in regressions:
+            print(f"⚠️ 回退: 用户 {r['users']} 行为 {r['behaviors']} {r['stage']}: "
+                  f"{prev['seconds']:.4f}s -> {r['seconds']:.4f}s")
+        if regressions:
+            return 1
+        print("未发现性能回退")
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
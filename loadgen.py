@@ -0,0 +1,102 @@
+"""
+推荐服务压测脚本
+多个并发客户端（各自保持长连接）持续请求 serve.py 的 /recommend，结束后打印客户端统计的
+延迟分位数与吞吐量，以及服务端 /stats。
+
+用法：
+    python serve.py &                     # 先启动服务
+    python loadgen.py --concurrency 32 --duration 10
+    python loadgen.py --url http://127.0.0.1:8000 --requests 20000 --output load.json
+"""
+
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+def get_json(conn, path):
+    conn.request('GET', path)
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+def worker(url, user_ids, top_n, stop_at, quota, latencies, errors, seed):
+    """单个客户端：随机挑用户循环请求，直到超时或完成配额"""
+    rng = np.random.default_rng(seed)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    try:
+        done = 0
+        while time.perf_counter() < stop_at and (quota is None or done < quota):
+            user_id = user_ids[rng.integers(len(user_ids))]
+            start = time.perf_counter()
+            try:
+                status, _ = get_json(conn, f"/recommend?user_id={user_id}&top_n={top_n}")
+            except (OSError, http.client.HTTPException):
+                # 连接异常时重连
+                conn.close()
+                conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+                status = None
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+            done += 1
+    finally:
+        conn.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="推荐服务压测")
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=32, help="并发客户端数")
+    parser.add_argument('--duration', type=float, default=10.0, help="压测时长（秒）")
+    parser.add_argument('--requests', type=int, default=None, help="总请求数（给定时达到即停止）")
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help="结果 JSON 路径")
+    args = parser.parse_args(argv)
+
+    url = urlparse(args.url)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    _, health = get_json(conn, '/health')
+    user_ids = health['sample_user_ids']
+    print(f"服务: {health['algorithm']}  用户 {health['users']}  新闻 {health['news']}", flush=True)
+
+    latencies, errors = [], []
+    quota = None if args.requests is None else -(-args.requests // args.concurrency)
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=worker, args=(url, user_ids, args.top_n, start + args.duration, quota,
+                                              latencies, errors, args.seed + i))
+        for i in range(args.concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    client = {
+        'concurrency': args.concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': round(elapsed, 2),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3) if len(ms) else None,
+        'p99_ms': round(float(np.percentile(ms, 99)), 3) if len(ms) else None,
+    }
+    _, server = get_json(conn, '/stats')
+    conn.close()
+
+    print("客户端:", json.dumps(client, ensure_ascii=False))
+    print("服务端:", json.dumps(server, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'client': client, 'server': server}, f, ensure_ascii=False, indent=2)
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""
+本地推荐服务
+启动时加载数据并构建一次模型，通过 HTTP 提供推荐查询；短时间窗口内到达的并发请求
+合并为一次批量打分（recommend_users），/stats 提供延迟分位数与吞吐量。
+重复请求直接命中推荐结果缓存，不进入批处理队列。
+
+用法：
+    python serve.py                                   # 默认读取 data_bin/，没有时生成场景数据
+    python serve.py --algorithm als --port 8000 --max-batch 256 --max-wait-ms 5
+    python serve.py --users 100000 --behaviors 1000000
+    python serve.py --window-days 7 --explore 5       # 候选集：近 7 天、用户兴趣类别 + 5 条探索
+    python serve.py --cache-size 0                    # 关闭推荐结果缓存
+
+接口：
+    GET /recommend?user_id=5&top_n=10   推荐结果
+    GET /stats                          延迟 p50/p99、吞吐量、批大小、缓存命中率等计数
+    GET /health                         服务状态与部分用户 ID（供压测脚本使用）
+"""
+
+import argparse
+import functools
+import json
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from utils import *
+
+class _Pending:
+    """一个等待批处理结果的请求"""
+
+    def __init__(self, user_id, top_n, key=None, epoch=None):
+        self.user_id = user_id
+        self.top_n = top_n
+        self.key = key
+        self.epoch = epoch
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+class MicroBatcher:
+    """请求微批：后台线程取出第一个请求后最多再等待 max_wait 秒或凑满 max_batch 个，一起打分"""
+
+    def __init__(self, model, news_df, max_batch=256, max_wait=0.005, top_k=5, stats=None,
+                 candidates=None, interests=None, cache=None):
+        """candidates(兴趣元组) -> 候选列下标，给定时只在候选集内排序；interests 与模型的用户行对齐；
+        cache 为 RecommendationCache 时先查缓存，未命中的请求算完后写回
+        """
+        self.model = model
+        self.cache = cache
+        self.candidates = candidates
+        self.interests = interests
+        self.news_df = news_df
+        self.catalog = item_catalog(news_df, model.matrix)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.top_k = top_k
+        self.stats = stats
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, user_id, top_n=10, timeout=30):
+        """提交一个请求并等待结果；用户不存在时抛出 KeyError"""
+        key = epoch = None
+        if self.cache is not None:
+            key = self.cache.key(self.model, user_id, self.top_k, top_n)
+            epoch = self.cache.epoch
+            result = self.cache.lookup(key)
+            if result is not None:
+                return result
+        pending = _Pending(user_id, top_n, key, epoch)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError("推荐超时")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch):
+        # 不存在的用户单独报错，不影响同批其他请求
+        user_ids = np.array([p.user_id for p in batch])
+        known = self.model.user_index.get_indexer(user_ids) >= 0
+        for pending in np.array(batch, dtype=object)[~known]:
+            pending.error = KeyError(f"未知的用户: {pending.user_id}")
+            pending.done.set()
+
+        valid = [p for p, ok in zip(batch, known) if ok]
+        if valid:
+            try:
+                ids, scores = self._score(user_ids[known], max(p.top_n for p in valid))
+            except Exception as e:
+                for pending in valid:
+                    pending.error = e
+                    pending.done.set()
+                return
+            cols = self.catalog.index.get_indexer(ids)
+            for i, pending in enumerate(valid):
+                n = min(pending.top_n, ids.shape[1])
+                hit = cols[i, :n] >= 0
+                rows = cols[i, :n][hit]
+                pending.result = [
+                    {'news_id': int(news_id), 'title': title, 'category': category, 'score': float(score)}
+                    for news_id, title, category, score in zip(
+                        self.catalog.ids[rows], self.catalog.titles[rows],
+                        self.catalog.categories[rows], scores[i, :n][hit]
+                    )
+                ]
+                if pending.key is not None:
+                    self.cache.store(self.model, pending.key, pending.result, pending.epoch)
+                pending.done.set()
+        if self.stats is not None:
+            self.stats.record_batch(len(batch))
+
+    def _score(self, user_ids, top_n):
+        """批量打分；启用候选集时按兴趣组合分组，每组一次 recommend_users"""
+        if self.candidates is None:
+            return self.model.recommend_users(user_ids, self.news_df, top_k=self.top_k, top_n=top_n)
+        ids = np.full((len(user_ids), top_n), -1, dtype=self.catalog.ids.dtype)
+        scores = np.zeros((len(user_ids), top_n), dtype=np.float32)
+        rows = self.model.user_index.index_of(user_ids)
+        for key, pos in group_by_interests(self.interests[rows]).items():
+            group_ids, group_scores = self.model.recommend_users(
+                user_ids[pos], self.news_df, top_k=self.top_k, top_n=top_n, candidates=self.candidates(key)
+            )
+            ids[pos, :group_ids.shape[1]] = group_ids
+            scores[pos, :group_ids.shape[1]] = group_scores
+        return ids, scores
+
+class ServiceStats:
+    """服务端计数：最近 window 个请求的延迟分位数、最近 rate_window 秒的吞吐量、批大小"""
+
+    def __init__(self, window=10000, rate_window=10.0):
+        self.started = time.time()
+        self.rate_window = rate_window
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self._latencies = deque(maxlen=window)
+        self._finished = deque()
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok=True):
+        now = time.time()
+        with self._lock:
+            self.requests += 1
+            self.errors += 0 if ok else 1
+            self._latencies.append(seconds)
+            self._finished.append(now)
+            while self._finished and self._finished[0] < now - self.rate_window:
+                self._finished.popleft()
+
+    def record_batch(self, size):
+        with self._lock:
+            self.batches += 1
+            self.batched_requests += size
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            recent = sum(1 for t in self._finished if t >= now - self.rate_window)
+            uptime = now - self.started
+            return {
+                'requests': self.requests,
+                'errors': self.errors,
+                'uptime_s': round(uptime, 1),
+                'throughput_rps': round(recent / min(self.rate_window, max(uptime, 1e-9)), 1),
+                'p50_ms': round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+                'p99_ms': round(float(np.percentile(latencies, 99)), 3) if len(latencies) else None,
+                'batches': self.batches,
+                'mean_batch_size': round(self.batched_requests / self.batches, 2) if self.batches else None,
+            }
+
+class RecommendServer(ThreadingHTTPServer):
+    """默认 listen 队列只有 5，高并发建连时会被拒绝或重传，这里加大到 256"""
+
+    request_queue_size = 256
+    daemon_threads = True
+
+def make_handler(batcher, stats, info):
+    def snapshot():
+        payload = stats.snapshot()
+        if batcher.cache is not None:
+            payload['cache'] = batcher.cache.stats()
+        return payload
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == '/recommend':
+                self._recommend(query)
+            elif url.path == '/stats':
+                self._send(200, snapshot())
+            elif url.path == '/health':
+                self._send(200, info)
+            else:
+                self._send(404, {'error': f"未知路径: {url.path}"})
+
+        def _recommend(self, query):
+            start = time.perf_counter()
+            try:
+                user_id = int(query['user_id'][0])
+                top_n = int(query.get('top_n', ['10'])[0])
+            except (KeyError, ValueError):
+                self._send(400, {'error': "需要整数参数 user_id（可选 top_n）"})
+                return
+            if top_n < 1:
+                self._send(400, {'error': "top_n 必须为正整数"})
+                return
+            try:
+                recommendations = batcher.submit(user_id, top_n)
+            except KeyError as e:
+                stats.record(time.perf_counter() - start, ok=False)
+                self._send(404, {'error': str(e.args[0])})
+                return
+            except Exception as e:
+                stats.record(time.perf_counter() - start, ok=False)
+                self._send(500, {'error': str(e)})
+                return
+            stats.record(time.perf_counter() - start)
+            self._send(200, {'user_id': user_id, 'recommendations': recommendations})
+
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # 压测时逐条打印访问日志会成为瓶颈
+            pass
+
+    return Handler
+
+def load_data(args):
+    """优先读取列式二进制数据，没有时按参数生成场景数据"""
+    if not args.generate:
+        users_df, news_df, behaviors_df = load_dataset_binary(args.data)
+        if users_df is not None:
+            return users_df, news_df, behaviors_df
+    return generate_scenario(args.scenario, seed=args.seed, n_users=args.users,
+                             n_news=args.news, n_behaviors=args.behaviors)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地推荐服务（HTTP，请求微批）")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--algorithm', default='user_cf', choices=list(ALGORITHMS))
+    parser.add_argument('--data', default=DATA_DIR, help="列式二进制数据目录")
+    parser.add_argument('--generate', action='store_true', help="忽略已有数据，直接生成场景数据")
+    parser.add_argument('--scenario', default="场景2: 综合媒体", help="生成数据使用的场景")
+    parser.add_argument('--users', type=int, default=None, help="生成的用户数（默认使用场景自带规模）")
+    parser.add_argument('--news', type=int, default=None, help="生成的新闻数")
+    parser.add_argument('--behaviors', type=int, default=None, help="生成的行为数")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--top-k', type=int, default=5, help="相似用户数")
+    parser.add_argument('--max-batch', type=int, default=256, help="单批最多合并的请求数（1 表示不合并）")
+    parser.add_argument('--window-days', type=float, default=None,
+                        help="启用候选集预筛选：只在最近几天发布的新闻中排序")
+    parser.add_argument('--all-categories', action='store_true', help="候选集不按用户兴趣类别过滤")
+    parser.add_argument('--explore', type=int, default=5, help="候选集中兴趣以外的探索条数")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="凑批的最长等待时间（毫秒）")
+    parser.add_argument('--cache-size', type=int, default=100000, help="推荐结果缓存条数（0 表示不缓存）")
+    parser.add_argument('--cache-mb', type=float, default=256, help="推荐结果缓存内存上限（MB）")
+    parser.add_argument('--cache-ttl', type=float, default=None, help="推荐结果缓存有效期（秒）")
+    args = parser.parse_args(argv)
+
+    users_df, news_df, behaviors_df = load_data(args)
+    print(f"用户 {len(users_df)}  新闻 {len(news_df)}  行为 {len(behaviors_df)}", flush=True)
+    start = time.perf_counter()
+    model = build_model(build_user_item_matrix(users_df, news_df, behaviors_df), args.algorithm)
+    print(f"{ALGORITHM_NAMES[args.algorithm]} 模型构建完成，用时 {time.perf_counter() - start:.1f}s", flush=True)
+
+    candidates = interests = None
+    if args.window_days is not None:
+        index = CandidateIndex(news_df)
+        window = args.window_days * 86400
+
+        @functools.lru_cache(maxsize=1024)
+        def candidates(key):
+            return index.candidates(interests=None if args.all_categories else list(key), window=window,
+                                    explore=args.explore, seed=args.seed)
+
+        interests = users_df['interests'].to_numpy()
+
+    cache = None
+    if args.cache_size > 0:
+        cache = RecommendationCache(max_entries=args.cache_size, max_bytes=int(args.cache_mb * (1 << 20)),
+                                    ttl=args.cache_ttl)
+
+    stats = ServiceStats()
+    batcher = MicroBatcher(model, news_df, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000,
+                           top_k=args.top_k, stats=stats, candidates=candidates, interests=interests,
+                           cache=cache)
+    rng = np.random.default_rng(args.seed)
+    user_ids = users_df['user_id'].to_numpy()
+    info = {
+        'status': 'ok',
+        'algorithm': args.algorithm,
+        'users': len(users_df),
+        'news': len(news_df),
+        'sample_user_ids': rng.choice(user_ids, size=min(1000, len(user_ids)), replace=False).tolist(),
+    }
+    server = RecommendServer((args.host, args.port), make_handler(batcher, stats, info))
+    print(f"服务已启动: http://{args.host}:{server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# 仓库没有打包，测试直接导入根目录下的 utils
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import generate_scenario, build_user_item_matrix  # noqa: E402
+
+@pytest.fixture(scope='session')
+def dataset():
+    """小规模场景数据：(users_df, news_df, behaviors_df)"""
+    return generate_scenario("场景2: 综合媒体", seed=7, n_users=300, n_news=200, n_behaviors=6000)
+
+@pytest.fixture(scope='session')
+def matrix(dataset):
+    return build_user_item_matrix(*dataset)
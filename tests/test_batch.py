@@ -0,0 +1,63 @@
+"""批量推荐与单用户推荐的一致性"""
+
+import numpy as np
+import pytest
+
+from utils import ALGORITHMS, NeighborIndex, build_model, calculate_user_similarity, recommend_for_user, recommend_for_users
+
+# top_n 取全部新闻，使两条路径都返回所有得分为正的新闻，结果与同分时的先后顺序无关
+TOP_N = 200
+TOP_K = 5
+
+def _tied_at_cutoff(similarity, row):
+    """稠密相似度中第 TOP_K 与第 TOP_K+1 个邻居同分时，两条路径可能选中不同的邻居"""
+    if isinstance(similarity, NeighborIndex):
+        return False
+    sims = np.array(similarity[row], dtype=np.float64)
+    sims[row] = -np.inf
+    ranked = np.sort(sims)[::-1]
+    return np.isclose(ranked[TOP_K - 1], ranked[TOP_K], rtol=0, atol=1e-6)
+
+@pytest.mark.parametrize('k', [None, 20])
+def test_recommend_for_users_matches_single(dataset, matrix, k):
+    users_df, news_df, _ = dataset
+    similarity = calculate_user_similarity(matrix, k=k)
+    user_ids = users_df['user_id'].to_numpy()[:50]
+    ids, scores = recommend_for_users(user_ids, similarity, matrix, news_df, top_k=TOP_K, top_n=TOP_N)
+    assert np.all(np.diff(scores, axis=1) <= 0)
+    for i, (user_id, row) in enumerate(zip(user_ids, ids)):
+        if _tied_at_cutoff(similarity, i):
+            continue
+        _, recommendations = recommend_for_user(int(user_id), similarity, matrix, news_df, top_k=TOP_K,
+                                                top_n=TOP_N)
+        assert {news_id for news_id, *_ in recommendations} == set(row[row >= 0].tolist())
+
+@pytest.mark.parametrize('algorithm', list(ALGORITHMS))
+def test_model_batch_matches_single(dataset, matrix, algorithm):
+    users_df, news_df, _ = dataset
+    model = build_model(matrix, algorithm)
+    user_ids = users_df['user_id'].to_numpy()[:30]
+    ids, _ = model.recommend_users(user_ids, news_df, top_n=TOP_N)
+    for user_id, row in zip(user_ids, ids):
+        _, recommendations = model.recommend(int(user_id), news_df, top_n=TOP_N)
+        assert {news_id for news_id, *_ in recommendations} == set(row[row >= 0].tolist())
+
+def test_no_neighbors_gives_empty_results(dataset, matrix):
+    users_df, news_df, _ = dataset
+    ids, _ = recommend_for_users(users_df['user_id'].to_numpy()[:5], calculate_user_similarity(matrix, k=20),
+                                 matrix, news_df, top_k=0)
+    assert np.all(ids == -1)
+
+@pytest.mark.parametrize('algorithm', list(ALGORITHMS))
+def test_candidates_restrict_batch_and_single(dataset, matrix, algorithm):
+    users_df, news_df, _ = dataset
+    model = build_model(matrix, algorithm)
+    candidates = np.arange(0, matrix.shape[1], 3)
+    allowed = set(news_df['news_id'].to_numpy()[candidates].tolist())
+    user_ids = users_df['user_id'].to_numpy()[:20]
+    ids, _ = model.recommend_users(user_ids, news_df, top_n=TOP_N, candidates=candidates)
+    for user_id, row in zip(user_ids, ids):
+        batch = set(row[row >= 0].tolist())
+        assert batch <= allowed
+        _, recommendations = model.recommend(int(user_id), news_df, top_n=TOP_N, candidates=candidates)
+        assert {news_id for news_id, *_ in recommendations} == batch
@@ -0,0 +1,62 @@
+"""列式二进制存储"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import (binary_is_current, build_user_item_matrix, csv_state, load_dataset_binary, load_dataset_chunked,
+                   save_dataset, save_dataset_binary)
+
+def _same_matrix(a, b):
+    assert a.shape == b.shape
+    np.testing.assert_allclose(a.toarray(), b.toarray(), rtol=1e-6)
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_binary_round_trip(dataset, tmp_path, mmap):
+    users_df, news_df, behaviors_df = dataset
+    save_dataset_binary(users_df, news_df, behaviors_df, path=tmp_path)
+    users, news, behaviors = load_dataset_binary(tmp_path, mmap=mmap)
+
+    assert np.array_equal(users['user_id'], users_df['user_id'])
+    assert list(users['interests']) == list(users_df['interests'])
+    assert list(users['gender'].astype(str)) == list(users_df['gender'].astype(str))
+    assert list(news['title']) == list(news_df['title'])
+    assert list(news['category'].astype(str)) == list(news_df['category'].astype(str))
+    for loaded, original, col in ((news, news_df, 'publish_time'), (behaviors, behaviors_df, 'timestamp')):
+        assert np.array_equal(loaded[col].to_numpy(), pd.to_datetime(original[col]).to_numpy().astype('datetime64[s]'))
+    _same_matrix(build_user_item_matrix(users, news, behaviors),
+                 build_user_item_matrix(users_df, news_df, behaviors_df))
+
+def test_binary_save_keeps_mapped_data(dataset, tmp_path):
+    users_df, news_df, behaviors_df = dataset
+    save_dataset_binary(users_df, news_df, behaviors_df, path=tmp_path)
+    _, _, mapped = load_dataset_binary(tmp_path)
+    before = mapped['news_id'].to_numpy().copy()
+    for _ in range(3):
+        save_dataset_binary(users_df, news_df, behaviors_df.iloc[:10], path=tmp_path)
+    assert np.array_equal(mapped['news_id'].to_numpy(), before)
+    assert len(load_dataset_binary(tmp_path)[2]) == 10
+    assert not any(name.endswith('.npy') for name in os.listdir(tmp_path))
+
+def test_binary_is_current_tracks_csv_files(dataset, tmp_path, monkeypatch):
+    users_df, news_df, behaviors_df = dataset
+    monkeypatch.chdir(tmp_path)
+    # 只有二进制数据时直接使用
+    save_dataset_binary(users_df, news_df, behaviors_df)
+    assert binary_is_current()
+
+    # 之后放入的 CSV 比二进制数据新
+    save_dataset(users_df, news_df, behaviors_df.iloc[:100])
+    assert not binary_is_current()
+    _, _, behaviors, _ = load_dataset_chunked()
+    assert len(behaviors) == 100
+    assert binary_is_current()
+
+    # 同时写出的 CSV 与二进制数据
+    save_dataset(users_df, news_df, behaviors_df)
+    save_dataset_binary(users_df, news_df, behaviors_df, source=csv_state())
+    assert binary_is_current()
+    save_dataset(users_df, news_df, behaviors_df.iloc[:50])
+    assert not binary_is_current()
@@ -0,0 +1,45 @@
+"""分块精确相似度（落盘）"""
+
+import json
+
+import numpy as np
+import pytest
+from sklearn.metrics.pairwise import cosine_similarity
+
+from utils import blocked_similarity, build_user_item_matrix, calculate_user_similarity, load_similarity
+
+class _Stop(Exception):
+    pass
+
+def test_blocked_matches_dense(matrix, tmp_path):
+    similarity = blocked_similarity(matrix, tmp_path, tile=64, n_workers=2)
+    np.testing.assert_allclose(similarity, cosine_similarity(matrix), atol=1e-5)
+    assert np.array_equal(load_similarity(tmp_path), similarity)
+
+def test_resume_after_interrupt(matrix, tmp_path):
+    calls = []
+    def interrupt(done, total):
+        calls.append(done)
+        if len(calls) == 6:
+            raise _Stop
+
+    with pytest.raises(_Stop):
+        blocked_similarity(matrix, tmp_path, tile=32, checkpoint=2, progress=interrupt, n_workers=1)
+    with open(tmp_path / 'manifest.json', encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert not manifest['complete'] and len(manifest['done']) >= 2
+    assert load_similarity(tmp_path) is None
+
+    resumed = []
+    similarity = blocked_similarity(matrix, tmp_path, tile=32, progress=lambda done, total: resumed.append((done, total)),
+                                    n_workers=1)
+    # 已记录的块不再计算
+    assert resumed[0][0] > 1 and len(resumed) == resumed[-1][1] - resumed[0][0] + 1
+    np.testing.assert_allclose(similarity, cosine_similarity(matrix), atol=1e-5)
+
+def test_changed_matrix_restarts(dataset, matrix, tmp_path):
+    users_df, news_df, behaviors_df = dataset
+    blocked_similarity(matrix, tmp_path, tile=64)
+    other = build_user_item_matrix(users_df, news_df, behaviors_df.iloc[:3000])
+    similarity = calculate_user_similarity(other, path=tmp_path)
+    np.testing.assert_allclose(similarity, cosine_similarity(other), atol=1e-5)
@@ -0,0 +1,69 @@
+"""推荐结果缓存"""
+
+import numpy as np
+import pytest
+
+import utils
+from utils import ALGORITHMS, RecommendationCache, build_model
+
+@pytest.mark.parametrize('algorithm', list(ALGORITHMS))
+def test_cached_results_never_stale(dataset, matrix, algorithm):
+    users_df, news_df, _ = dataset
+    model = build_model(matrix, algorithm)
+    cache = RecommendationCache()
+    user_ids = users_df['user_id'].to_numpy()
+    news_ids = news_df['news_id'].to_numpy()
+    for user_id in user_ids:
+        cache.get(model, int(user_id), news_df)
+
+    rng = np.random.default_rng(0)
+    for _ in range(10):
+        model.add_behaviors(rng.choice(user_ids, 3), rng.choice(news_ids, 3), ['like'] * 3)
+        for user_id in rng.choice(user_ids, 30):
+            assert cache.get(model, int(user_id), news_df) == model.recommend(int(user_id), news_df)
+    for user_id in user_ids:
+        assert cache.get(model, int(user_id), news_df) == model.recommend(int(user_id), news_df)
+
+def test_invalidation_is_targeted(dataset, matrix):
+    users_df, news_df, _ = dataset
+    model = build_model(matrix, k=20)
+    cache = RecommendationCache()
+    user_ids = users_df['user_id'].to_numpy()
+    for user_id in user_ids:
+        cache.get(model, int(user_id), news_df)
+
+    unseen = np.flatnonzero(model.matrix[0].toarray().ravel() == 0)[0]
+    model.add_behavior(int(user_ids[0]), int(news_df['news_id'].iloc[unseen]), 'like')
+    stats = cache.stats()
+    assert 0 < stats['invalidations'] < len(user_ids)
+    assert stats['entries'] == len(user_ids) - stats['invalidations']
+
+def test_version_change_and_copy(dataset, matrix):
+    users_df, news_df, _ = dataset
+    model = build_model(matrix, 'als', iterations=2)
+    cache = RecommendationCache()
+    user_id = int(users_df['user_id'].iloc[0])
+    cache.get(model, user_id, news_df)
+
+    clone = model.copy()
+    assert clone.version != model.version and clone._listeners == []
+    cache.get(model, user_id, news_df)
+    assert cache.hits == 1
+
+    # 重训后版本变化，旧条目不再命中
+    model.fit(iterations=1)
+    assert cache.get(model, user_id, news_df) == model.recommend(user_id, news_df)
+    assert cache.hits == 1
+
+def test_limits_and_ttl(dataset, matrix, monkeypatch):
+    users_df, news_df, _ = dataset
+    model = build_model(matrix)
+    cache = RecommendationCache(max_entries=5, ttl=10)
+    for user_id in users_df['user_id'].to_numpy()[:8]:
+        cache.get(model, int(user_id), news_df)
+    assert len(cache) == 5 and cache.evictions == 3
+
+    now = utils.time.monotonic()
+    monkeypatch.setattr(utils.time, 'monotonic', lambda: now + 11)
+    cache.get(model, int(users_df['user_id'].iloc[7]), news_df)
+    assert cache.hits == 0
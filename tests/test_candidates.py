@@ -0,0 +1,50 @@
+"""候选集预筛选"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import CandidateIndex
+
+@pytest.fixture
+def news_df(dataset):
+    news_df = dataset[1].copy()
+    news_df['category'] = news_df['category'].astype(str).replace('科技', '汽车')
+    return news_df
+
+def _epochs(news_df):
+    return pd.to_datetime(news_df['publish_time'].astype(str)).to_numpy().astype('datetime64[s]').astype(np.int64)
+
+def _brute_force(news_df, interests, window, now):
+    times = _epochs(news_df)
+    mask = times <= now
+    if window is not None:
+        mask &= times >= now - window
+    if interests is not None:
+        mask &= news_df['category'].isin(interests).to_numpy()
+    return np.flatnonzero(mask)
+
+@pytest.mark.parametrize('interests', [None, ['体育'], ['汽车', '财经'], ['不存在']])
+@pytest.mark.parametrize('window', [None, 86400, 7 * 86400])
+def test_candidates_match_brute_force(news_df, interests, window):
+    index = CandidateIndex(news_df)
+    now = index.latest - 86400
+    candidates = index.candidates(interests, window=window, now=now)
+    assert np.array_equal(candidates, _brute_force(news_df, interests, window, now))
+
+def test_limit_keeps_newest_per_category(news_df):
+    index = CandidateIndex(news_df)
+    candidates = index.candidates(['体育'], limit=3)
+    times = _epochs(news_df)
+    sports = np.flatnonzero(news_df['category'].to_numpy() == '体育')
+    assert len(candidates) == 3
+    assert times[candidates].min() >= np.sort(times[sports])[-3]
+
+def test_explore_adds_other_categories(news_df):
+    index = CandidateIndex(news_df)
+    base = index.candidates(['体育'])
+    explored = index.candidates(['体育'], explore=5, seed=0)
+    extra = np.setdiff1d(explored, base)
+    assert len(extra) == 5
+    assert (news_df['category'].to_numpy()[extra] != '体育').all()
+    assert np.array_equal(explored, index.candidates(['体育'], explore=5, seed=0))
@@ -0,0 +1,35 @@
+"""ID 索引与新闻元数据目录"""
+
+import numpy as np
+
+from utils import build_model, build_user_item_matrix, item_catalog
+
+def test_catalog_follows_matrix_not_mutated_frame(dataset):
+    users_df, news_df, behaviors_df = dataset
+    news_df = news_df.copy()
+    matrix = build_user_item_matrix(users_df, news_df, behaviors_df)
+    model = build_model(matrix)
+    user_id = int(users_df['user_id'].iloc[0])
+    _, before = model.recommend(user_id, news_df)
+
+    # 同长度的原地修改：矩阵的列仍对应构建时的新闻
+    news_df.sort_values('news_id', ascending=False, inplace=True, ignore_index=True)
+    _, after = model.recommend(user_id, news_df)
+    assert after == before
+    ids, _ = model.recommend_users([user_id], news_df)
+    assert set(ids[0][ids[0] >= 0].tolist()) == {news_id for news_id, *_ in before}
+
+def test_catalog_without_matrix_reads_current_frame(dataset):
+    news_df = dataset[1].copy()
+    first = item_catalog(news_df)
+    news_df['title'] = news_df['title'] + '!'
+    assert item_catalog(news_df).titles[0] == first.titles[0] + '!'
+    assert np.array_equal(item_catalog(news_df).ids, news_df['news_id'].to_numpy())
+
+def test_category_codes_cover_unknown_categories(dataset):
+    news_df = dataset[1].copy()
+    news_df['category'] = news_df['category'].astype(str).replace('科技', '汽车')
+    catalog = item_catalog(news_df)
+    assert (catalog.category_codes >= 0).all()
+    names = np.array(catalog.category_names, dtype=object)[catalog.category_codes]
+    assert list(names) == list(news_df['category'])
@@ -0,0 +1,32 @@
+"""分块流式读取行为 CSV"""
+
+import numpy as np
+import pytest
+
+from utils import build_user_item_matrix, load_dataset_binary, load_dataset_chunked, load_interaction_matrix, save_dataset
+
+@pytest.fixture
+def csv_dir(dataset, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    save_dataset(*dataset)
+    return tmp_path
+
+def _same_matrix(a, b):
+    assert a.shape == b.shape
+    np.testing.assert_allclose(a.toarray(), b.toarray(), rtol=1e-6)
+
+@pytest.mark.parametrize('agg, half_life', [('max', None), ('sum', None), ('max', 7 * 86400)])
+def test_load_interaction_matrix_matches_build(dataset, csv_dir, agg, half_life):
+    users_df, news_df, behaviors_df = dataset
+    expected = build_user_item_matrix(users_df, news_df, behaviors_df, agg=agg, half_life=half_life)
+    loaded = load_interaction_matrix(users_df, news_df, chunk_size=700, agg=agg, half_life=half_life)
+    _same_matrix(loaded, expected)
+
+def test_load_dataset_chunked_writes_binary(dataset, csv_dir):
+    users_df, news_df, behaviors_df = dataset
+    users, news, behaviors, matrix = load_dataset_chunked(chunk_size=700)
+    _same_matrix(matrix, build_user_item_matrix(users_df, news_df, behaviors_df))
+    assert np.array_equal(behaviors['user_id'], behaviors_df['user_id'])
+    assert np.array_equal(behaviors['action'].astype(str), behaviors_df['action'].astype(str))
+    # 下次导入直接读取写好的二进制数据
+    assert len(load_dataset_binary()[2]) == len(behaviors_df)
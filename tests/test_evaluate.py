@@ -0,0 +1,30 @@
+"""离线评估"""
+
+import numpy as np
+import pandas as pd
+
+from utils import evaluate_offline, leave_one_out_split, ranking_metrics
+
+def test_diversity_counts_each_category_once(dataset):
+    news_df = dataset[1].copy()
+    news_df['category'] = news_df['category'].astype(str).replace('科技', '汽车')
+    by_cat = news_df.groupby('category')['news_id'].first()
+    rec_ids = np.array([[by_cat['汽车'], by_cat['体育'], -1], [by_cat['时政'], -1, -1]])
+    metrics = ranking_metrics(rec_ids, [by_cat['体育'], 0], news_df)
+    assert metrics['类别多样性'] == 1.5
+    assert metrics['命中率'] == 0.5
+
+def test_missing_category_is_not_counted(dataset):
+    news_df = dataset[1].copy()
+    news_df['category'] = news_df['category'].astype(object)
+    news_df.loc[0, 'category'] = None
+    rec_ids = np.array([[news_df['news_id'].iloc[0], -1]])
+    assert ranking_metrics(rec_ids, [0], news_df)['类别多样性'] == 0
+
+def test_empty_split_and_top_k_above_k(dataset):
+    users_df, news_df, behaviors_df = dataset
+    train, test = leave_one_out_split(behaviors_df.iloc[:0])
+    assert len(train) == 0 and len(test) == 0
+    result = evaluate_offline(users_df, news_df, behaviors_df, algorithms=[('user_cf', {'k': 20})],
+                              top_k=(5, 40), top_n=(10,))
+    assert isinstance(result, pd.DataFrame) and len(result) == 2
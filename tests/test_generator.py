@@ -0,0 +1,45 @@
+"""向量化数据生成与逐条生成的分布一致性"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import CATEGORIES, generate_scenario, generate_scenario_fast
+
+SCENARIOS = ["场景1: 科技媒体", "场景2: 综合媒体", "场景3: 信息茧房", "场景4: 冷启动"]
+
+def _stats(users_df, news_df, behaviors_df):
+    categories = news_df['category'].astype(str)
+    item_cat = dict(zip(news_df['news_id'], categories))
+    interests = dict(zip(users_df['user_id'], users_df['interests']))
+    in_interest = [item_cat[n] in interests[u] for u, n in zip(behaviors_df['user_id'], behaviors_df['news_id'])]
+    per_user = behaviors_df.groupby('user_id').size().reindex(users_df['user_id'], fill_value=0)
+    return {
+        'news_share': categories.value_counts(normalize=True).reindex(CATEGORIES, fill_value=0).to_numpy(),
+        'interest_k': users_df['interests'].map(len).mean(),
+        'tech_interest': users_df['interests'].map(lambda cats: '科技' in cats).mean(),
+        'per_user': per_user.mean(),
+        'in_interest': np.mean(in_interest),
+        'like': (behaviors_df['action'].astype(str) == 'like').mean(),
+    }
+
+@pytest.mark.parametrize('scenario', SCENARIOS)
+def test_fast_generator_matches_per_event_distribution(scenario):
+    # 逐条生成器固定 100 用户、500 新闻；向量化生成器取更大规模以压低抽样误差，容差约为逐条生成的 3 倍标准差
+    slow = _stats(*generate_scenario(scenario, seed=1))
+    fast = _stats(*generate_scenario_fast(scenario, n_users=2000, n_news=2000, seed=1))
+    np.testing.assert_allclose(fast['news_share'], slow['news_share'], atol=0.08)
+    assert fast['interest_k'] == pytest.approx(slow['interest_k'], abs=0.3)
+    assert fast['tech_interest'] == pytest.approx(slow['tech_interest'], abs=0.15)
+    assert fast['per_user'] == pytest.approx(slow['per_user'], rel=0.1)
+    assert fast['in_interest'] == pytest.approx(slow['in_interest'], abs=0.05)
+    assert fast['like'] == pytest.approx(slow['like'], abs=0.05)
+
+def test_fast_generator_is_seeded_and_sized():
+    first = generate_scenario_fast(SCENARIOS[1], n_users=50, n_news=40, n_behaviors=777, seed=5)
+    second = generate_scenario_fast(SCENARIOS[1], n_users=50, n_news=40, n_behaviors=777, seed=5)
+    for a, b in zip(first, second):
+        pd.testing.assert_frame_equal(a, b)
+    users_df, news_df, behaviors_df = first
+    assert len(users_df) == 50 and len(news_df) == 40 and len(behaviors_df) == 777
+    assert behaviors_df['news_id'].between(1, 40).all() and behaviors_df['user_id'].between(1, 50).all()
@@ -0,0 +1,53 @@
+"""后台重建与版本切换"""
+
+import threading
+
+from utils import ModelCache, ModelHolder
+
+def _loader(data, started=None, release=None, report=True):
+    def load(progress):
+        if report:
+            progress(0.0, "开始")
+        if started is not None:
+            started.set()
+            release.wait(10)
+        if report:
+            progress(0.5, "读取中")
+        return data
+    return load
+
+def test_submit_builds_and_swaps(dataset):
+    holder = ModelHolder(k=20)
+    holder.submit(_loader(dataset), 'first')
+    first = holder.wait(10)
+    assert first.version == 1 and first.label == 'first'
+    assert first.model.matrix.shape == (len(dataset[0]), len(dataset[1]))
+
+    holder.submit(_loader(dataset), 'second')
+    second = holder.wait(10)
+    assert second.version == 2 and holder.current is second
+    # 已取得的旧版本引用不受切换影响
+    assert first.model.matrix.nnz == second.model.matrix.nnz and first.label == 'first'
+
+def test_newer_submit_supersedes_build_in_progress(dataset):
+    users_df, news_df, behaviors_df = dataset
+    holder = ModelHolder(k=20)
+    for report in (True, False):
+        started, release = threading.Event(), threading.Event()
+        holder.submit(_loader((users_df, news_df, behaviors_df.iloc[:100]), started, release, report), 'old')
+        assert started.wait(10) and holder.building
+        holder.submit(_loader(dataset), 'new')
+        release.set()
+        current = holder.wait(10)
+        assert current.label == 'new' and len(current.behaviors_df) == len(behaviors_df)
+    # 被放弃的构建不产生版本
+    assert holder.version == 2 and not holder.building
+
+def test_failed_build_keeps_current_version(dataset):
+    holder = ModelHolder(k=20, model_cache=ModelCache())
+    holder.submit(_loader(dataset), 'ok')
+    current = holder.wait(10)
+    holder.submit(_loader(None), 'missing')
+    assert holder.wait(10) is current
+    status = holder.status()
+    assert status['error'] and status['label'] == 'missing' and not status['building']
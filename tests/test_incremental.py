@@ -0,0 +1,53 @@
+"""增量更新与全量重建的一致性"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import ALGORITHMS, build_model, build_user_item_matrix, simulate_echo_chamber
+
+def _new_events(dataset, n=60, seed=0):
+    users_df, news_df, _ = dataset
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'user_id': rng.choice(users_df['user_id'].to_numpy(), n),
+        'news_id': rng.choice(news_df['news_id'].to_numpy(), n),
+        'action': rng.choice(['click', 'like'], n),
+        'timestamp': '2026-01-31 12:00',
+    })
+
+@pytest.mark.parametrize('algorithm', ['user_cf', 'item_cf'])
+def test_add_behaviors_matches_rebuild(dataset, matrix, algorithm):
+    users_df, news_df, behaviors_df = dataset
+    events = _new_events(dataset)
+    model = build_model(matrix, algorithm)
+    model.add_behaviors(events['user_id'], events['news_id'], events['action'])
+
+    rebuilt = build_model(build_user_item_matrix(users_df, news_df, pd.concat([behaviors_df, events])), algorithm)
+    assert (model.matrix != rebuilt.matrix).nnz == 0
+    np.testing.assert_allclose(model.norms, rebuilt.norms, rtol=1e-5)
+
+    # 同分邻居的先后顺序可能不同，比较按降序排列的邻居相似度
+    index, expected = ((model.similarity, rebuilt.similarity) if algorithm == 'user_cf'
+                       else (model.item_neighbors, rebuilt.item_neighbors))
+    np.testing.assert_allclose(index.scores, expected.scores, atol=1e-5)
+
+def test_add_behavior_matches_add_behaviors(dataset, matrix):
+    events = _new_events(dataset, n=20, seed=1)
+    single, batch = build_model(matrix), build_model(matrix)
+    for row in events.itertuples():
+        single.add_behavior(row.user_id, row.news_id, row.action)
+    batch.add_behaviors(events['user_id'], events['news_id'], events['action'])
+    assert (single.matrix != batch.matrix).nnz == 0
+    np.testing.assert_allclose(single.similarity.scores, batch.similarity.scores, atol=1e-5)
+
+@pytest.mark.parametrize('algorithm', list(ALGORITHMS))
+def test_empty_batch_is_noop(matrix, algorithm):
+    model = build_model(matrix, algorithm)
+    assert model.add_behaviors(np.array([], dtype=np.int64), np.array([], dtype=np.int64), weights=[]) == 0
+
+def test_echo_chamber_incremental_matches_rebuild(dataset):
+    users_df, news_df, behaviors_df = dataset
+    incremental = simulate_echo_chamber(5, users_df, news_df, behaviors_df, iterations=4, incremental=True)
+    rebuilt = simulate_echo_chamber(5, users_df, news_df, behaviors_df, iterations=4, incremental=False)
+    assert [dist for _, dist, _ in incremental] == [dist for _, dist, _ in rebuilt]
@@ -0,0 +1,24 @@
+"""群体信息茧房模拟"""
+
+import numpy as np
+
+from utils import simulate_population
+
+def test_shares_follow_renamed_category(dataset):
+    users_df, news_df, behaviors_df = dataset
+    renamed = news_df.copy()
+    renamed['category'] = renamed['category'].astype(str).replace('科技', '汽车')
+    expected = simulate_population(users_df, news_df, behaviors_df, rounds=2)
+    result = simulate_population(users_df, renamed, behaviors_df, rounds=2)
+
+    np.testing.assert_allclose(result['汽车'], expected['科技'])
+    np.testing.assert_allclose(result['时政'], expected['时政'])
+    assert (result['科技'] == 0).all()
+    np.testing.assert_allclose(result['集中度'], expected['集中度'])
+
+def test_single_user_population(dataset):
+    users_df, news_df, behaviors_df = dataset
+    single = users_df.iloc[:1]
+    history = simulate_population(single, news_df, behaviors_df[behaviors_df['user_id'] == single['user_id'].iloc[0]],
+                                  rounds=2, algorithm='item_cf')
+    assert len(history) == 2
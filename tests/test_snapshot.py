@@ -0,0 +1,41 @@
+"""场景快照"""
+
+import os
+
+import numpy as np
+
+import utils
+from utils import build_model, generate_scenario, scenario_snapshot, scenario_snapshot_key
+
+PARAMS = dict(scenario_name="场景2: 综合媒体", seed=3, n_users=80, n_news=60, n_behaviors=800, k=10)
+
+def _keys(path):
+    return sorted(name for name in os.listdir(path) if not name.startswith('.'))
+
+def test_snapshot_matches_generated_data(tmp_path):
+    snapshot = scenario_snapshot(path=tmp_path, **PARAMS)
+    users_df, news_df, behaviors_df = generate_scenario(PARAMS['scenario_name'], seed=3, n_users=80, n_news=60,
+                                                        n_behaviors=800)
+    assert np.array_equal(snapshot.behaviors_df['news_id'], behaviors_df['news_id'])
+    assert list(snapshot.news_df['title']) == list(news_df['title'])
+
+    expected = build_model(utils.build_user_item_matrix(users_df, news_df, behaviors_df), k=10)
+    assert (snapshot.matrix != expected.matrix).nnz == 0
+    np.testing.assert_allclose(snapshot.similarity.scores, expected.similarity.scores, atol=1e-6)
+
+    # 再次请求直接加载同一快照
+    assert scenario_snapshot(path=tmp_path, **PARAMS).fingerprint == snapshot.fingerprint
+    assert _keys(tmp_path) == [scenario_snapshot_key('场景2: 综合媒体', 3, 80, 60, 800, 10)]
+
+def test_code_change_rekeys_and_removes_old_snapshot(tmp_path, monkeypatch):
+    scenario_snapshot(path=tmp_path, **PARAMS)
+    scenario_snapshot(path=tmp_path, **dict(PARAMS, seed=4))
+    other_key = scenario_snapshot_key('场景2: 综合媒体', 4, 80, 60, 800, 10)
+    assert len(_keys(tmp_path)) == 2
+
+    monkeypatch.setattr(utils, '_generator_hash', lambda: 'changed')
+    new_key = scenario_snapshot_key('场景2: 综合媒体', 3, 80, 60, 800, 10)
+    assert new_key not in _keys(tmp_path)
+    scenario_snapshot(path=tmp_path, **PARAMS)
+    # 同一参数由旧代码生成的快照被删除，其他参数的快照保留
+    assert _keys(tmp_path) == sorted([new_key, other_key])
@@ -0,0 +1,53 @@
+"""流式接入：待合并增量上的读取与合并后一致"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+from utils import ALGORITHMS, BehaviorStream, build_model, build_user_item_matrix
+
+def _events(dataset, n, seed=0):
+    users_df, news_df, _ = dataset
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'user_id': rng.choice(users_df['user_id'].to_numpy(), n),
+        'news_id': rng.choice(news_df['news_id'].to_numpy(), n),
+        'action': rng.choice(['click', 'like'], n),
+        'timestamp': '2026-01-31 12:00',
+    })
+
+@pytest.mark.parametrize('algorithm', list(ALGORITHMS))
+def test_pending_reads_match_merged(dataset, matrix, algorithm):
+    users_df, news_df, _ = dataset
+    events = _events(dataset, 200)
+    model = build_model(matrix, algorithm)
+    model.add_behaviors(events['user_id'], events['news_id'], events['action'])
+    assert model.interactions.pending > 0
+
+    user_ids = users_df['user_id'].to_numpy()
+    pending = model.recommend_users(user_ids, news_df)
+    single = [model.recommend(uid, news_df)[1] for uid in user_ids[:20]]
+    model.interactions.merge()
+    assert model.interactions.pending == 0
+    merged = model.recommend_users(user_ids, news_df)
+    assert all(np.array_equal(a, b) for a, b in zip(pending, merged))
+    assert single == [model.recommend(uid, news_df)[1] for uid in user_ids[:20]]
+
+@pytest.mark.parametrize('algorithm', ['user_cf', 'item_cf'])
+def test_stream_batches_match_rebuild(dataset, monkeypatch, algorithm):
+    # 阈值调小，让回放过程中发生多次合并
+    monkeypatch.setattr(utils, 'PENDING_MIN', 50)
+    users_df, news_df, behaviors_df = dataset
+    history, replay = behaviors_df.iloc[:-600], behaviors_df.iloc[-600:]
+    stream = BehaviorStream.from_frames(users_df, news_df, history, algorithm=algorithm)
+    for start in range(0, len(replay), 100):
+        stream.ingest(replay.iloc[start:start + 100])
+    assert stream.model.interactions.pending <= max(50, stream.model.interactions.base.nnz // utils.PENDING_RATIO)
+
+    rebuilt = build_model(build_user_item_matrix(users_df, news_df, behaviors_df), algorithm)
+    assert (stream.model.matrix != rebuilt.matrix).nnz == 0
+    np.testing.assert_allclose(stream.model.norms, rebuilt.norms, rtol=1e-5)
+    index, expected = ((stream.model.similarity, rebuilt.similarity) if algorithm == 'user_cf'
+                       else (stream.model.item_neighbors, rebuilt.item_neighbors))
+    np.testing.assert_allclose(index.scores, expected.scores, atol=1e-5)
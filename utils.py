@@ -1,14 +1,151 @@
 """
 工具函数模块
 添加：预设场景生成、信息茧房模拟
+添加：稀疏矩阵、Top-K 近邻索引、增量模型、批量推荐、模型缓存
+添加：向量化数据生成、列式二进制存储、性能埋点
+添加：物品协同过滤、隐因子模型（ALS）、群体信息茧房模拟、离线评估
+添加：ID 索引层（外部 ID ↔ 连续下标）、数组化新闻元数据
+添加：只追加的行为日志、流式增量接入、时间衰减、行为 CSV 分块流式加载
+添加：候选集预筛选（类别倒排索引、发布时间窗口）
+添加：推荐结果缓存（LRU/TTL，新行为只失效受影响的用户）
+添加：分块精确相似度（内存映射落盘、可断点续算）
+添加：后台重建模型、版本原子切换、场景快照（预建矩阵与近邻，内存映射加载）
 """
 
+import ast
+import copy
+import functools
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
 from datetime import datetime, timedelta
 import random
 
+# ========== 新增：性能埋点 ==========
+
+class PerfRecorder:
+    """进程级性能记录：各阶段的耗时、调用次数与数据规模
+
+    关闭时被 @instrumented 装饰的函数只多一次布尔判断，不计时也不记录
+    """
+
+    def __init__(self, maxlen=200):
+        self.enabled = False
+        self.recent = deque(maxlen=maxlen)
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, size=''):
+        with self._lock:
+            self.recent.append({
+                'stage': stage,
+                'seconds': seconds,
+                'size': size,
+                'time': datetime.now().strftime('%H:%M:%S')
+            })
+            calls, total = self.totals.get(stage, (0, 0.0))
+            self.totals[stage] = (calls + 1, total + seconds)
+
+    def summary(self):
+        """按阶段汇总：累计调用次数与耗时，以及最近一次的耗时和数据规模"""
+        with self._lock:
+            recent = list(self.recent)
+            totals = dict(self.totals)
+        last = {r['stage']: r for r in recent}
+        rows = []
+        for stage, (calls, total) in totals.items():
+            rows.append({
+                '阶段': stage,
+                '次数': calls,
+                '平均(ms)': total / calls * 1000,
+                '最近(ms)': last[stage]['seconds'] * 1000 if stage in last else None,
+                '规模': last[stage]['size'] if stage in last else ''
+            })
+        if not rows:
+            return pd.DataFrame(columns=['阶段', '次数', '平均(ms)', '最近(ms)', '规模'])
+        return pd.DataFrame(rows).sort_values('平均(ms)', ascending=False, ignore_index=True)
+
+    def to_frame(self):
+        """最近的逐次记录"""
+        with self._lock:
+            return pd.DataFrame(list(self.recent), columns=['stage', 'seconds', 'size', 'time'])
+
+    def export(self, path):
+        """导出逐次记录，按后缀写 .json 或 .csv"""
+        df = self.to_frame()
+        if path.endswith('.json'):
+            df.to_json(path, orient='records', force_ascii=False, indent=2)
+        else:
+            df.to_csv(path, index=False)
+
+    def reset(self):
+        with self._lock:
+            self.recent.clear()
+            self.totals.clear()
+
+PERF = PerfRecorder()
+
+def enable_perf(enabled=True):
+    """打开或关闭性能记录"""
+    PERF.enabled = enabled
+
+def instrumented(stage=None):
+    """装饰器：开启记录时统计函数耗时与返回值规模"""
+    def decorator(fn):
+        name = stage or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not PERF.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            result = fn(*args, **kwargs)
+            PERF.record(name, time.perf_counter() - start, _describe_size(result))
+            return result
+        return wrapper
+    return decorator
+
+@contextmanager
+def perf_stage(stage, size=''):
+    """上下文管理器：统计一段代码（如页面渲染）的耗时"""
+    if not PERF.enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PERF.record(stage, time.perf_counter() - start, size)
+
+def _describe_size(obj):
+    """用简短字符串描述数组、稀疏矩阵、DataFrame 等对象的规模"""
+    if isinstance(obj, (tuple, list)):
+        return ', '.join(filter(None, (_describe_size(o) for o in obj[:3])))
+    if isinstance(obj, pd.DataFrame):
+        return f"{len(obj)}行"
+    if sparse.issparse(obj):
+        return f"{obj.shape[0]}×{obj.shape[1]} nnz={obj.nnz}"
+    shape = getattr(obj, 'shape', None)
+    if shape is not None:
+        return '×'.join(str(d) for d in shape)
+    return ''
+
 # ========== 原有函数 ==========
 
 def generate_dataset():
@@ -70,10 +207,18 @@ def generate_dataset():
 
 # ========== 新增：预设场景生成 ==========
 
-def generate_scenario(scenario_name):
-    """根据场景名称生成特定数据"""
-    np.random.seed(42)
-    random.seed(42)
+@instrumented()
+def generate_scenario(scenario_name, seed=42, n_users=None, n_news=None, n_behaviors=None):
+    """根据场景名称生成特定数据
+
+    指定任一规模参数（用户数、新闻数、行为数）时改走向量化生成器 generate_scenario_fast
+    """
+    if n_users is not None or n_news is not None or n_behaviors is not None:
+        return generate_scenario_fast(scenario_name, n_users=n_users or 100, n_news=n_news or 500,
+                                      n_behaviors=n_behaviors, seed=seed)
+
+    np.random.seed(seed)
+    random.seed(seed)
 
     if "场景1" in scenario_name:  # 科技媒体
         return generate_tech_media()
@@ -212,28 +357,152 @@ def _generate_behaviors(users, news_df, interest_prob=0.8, min_behaviors=20, max
                 })
     return pd.DataFrame(behaviors)
 
+# ========== 新增：向量化数据生成 ==========
+
+CATEGORIES = ['科技', '体育', '娱乐', '财经', '时政']
+
+NEWS_TITLES = {
+    '科技': ['AI技术突破', '5G网络普及', '芯片创新', '量子计算', '人工智能'],
+    '体育': ['足球比赛', '篮球直播', '奥运动态', '运动员访谈', '体育政策'],
+    '娱乐': ['影视上映', '明星动态', '音乐节', '综艺节目', '娱乐八卦'],
+    '财经': ['股市行情', '经济政策', '企业财报', '投资理财', '市场趋势'],
+    '时政': ['国际形势', '政策解读', '社会热点', '民生新闻', '法律法规']
+}
+
+# 各场景的分布参数，与 generate_tech_media 等逐条生成函数保持一致：
+# news_weights 为新闻类别权重（按 CATEGORIES 顺序），interest_k 为兴趣个数范围，
+# focus 为 (必选类别, 概率)，其余为行为生成参数
+SCENARIO_CONFIGS = {
+    '场景1': {'news_weights': [6, 1, 1, 1, 1], 'interest_k': (2, 2), 'focus': ('科技', 0.9),
+             'interest_prob': 0.85, 'min_behaviors': 20, 'max_behaviors': 50},
+    '场景2': {'news_weights': [1, 1, 1, 1, 1], 'interest_k': (2, 3), 'focus': None,
+             'interest_prob': 0.75, 'min_behaviors': 20, 'max_behaviors': 50},
+    '场景3': {'news_weights': [1, 1, 1, 1, 1], 'interest_k': (1, 2), 'focus': None,
+             'interest_prob': 0.95, 'min_behaviors': 20, 'max_behaviors': 50},
+    '场景4': {'news_weights': [1, 1, 1, 1, 1], 'interest_k': (2, 4), 'focus': None,
+             'interest_prob': 0.8, 'min_behaviors': 5, 'max_behaviors': 15},
+    '默认': {'news_weights': [1, 1, 1, 1, 1], 'interest_k': (2, 4), 'focus': None,
+            'interest_prob': 0.8, 'min_behaviors': 20, 'max_behaviors': 50},
+}
+
+def _scenario_config(scenario_name):
+    for key, config in SCENARIO_CONFIGS.items():
+        if key in scenario_name:
+            return config
+    return SCENARIO_CONFIGS['默认']
+
+@instrumented()
+def generate_scenario_fast(scenario_name, n_users=100, n_news=500, n_behaviors=None, seed=42):
+    """向量化场景生成：用带种子的 np.random.Generator 一次性抽取类别、新闻、行为类型与时间
+
+    n_behaviors 为 None 时每个用户的行为数按场景范围随机；否则总行为数固定为 n_behaviors，
+    按同样的用户活跃度比例分配。action、timestamp 等低基数列使用 category 类型。
+    """
+    rng = np.random.default_rng(seed)
+    config = _scenario_config(scenario_name)
+    now = datetime.now()
+
+    # 用户兴趣：每行一个随机排列，取前 k 个类别；focus 类别以给定概率排在第一位
+    n_cat = len(CATEGORIES)
+    k_min, k_max = config['interest_k']
+    interest_k = rng.integers(k_min, k_max + 1, size=n_users)
+    keys = rng.random((n_users, n_cat))
+    if config['focus'] is not None:
+        focus_cat, focus_prob = config['focus']
+        keys[rng.random(n_users) < focus_prob, CATEGORIES.index(focus_cat)] = -1.0
+    interest_table = np.argsort(keys, axis=1)
+    cat_names = np.array(CATEGORIES, dtype=object)
+    users_df = pd.DataFrame({
+        'user_id': np.arange(1, n_users + 1),
+        'age': rng.integers(18, 61, size=n_users),
+        'gender': rng.choice(['M', 'F'], size=n_users),
+        'interests': [list(cat_names[row[:k]]) for row, k in zip(interest_table, interest_k)]
+    })
+
+    # 新闻：类别按权重抽取，标题从对应类别的模板中抽取
+    weights = np.asarray(config['news_weights'], dtype=np.float64)
+    news_cat = rng.choice(n_cat, size=n_news, p=weights / weights.sum())
+    title_pick = rng.integers(0, 5, size=n_news)
+    news_df = pd.DataFrame({
+        'news_id': np.arange(1, n_news + 1),
+        'title': [f"{NEWS_TITLES[CATEGORIES[c]][t]}{i}"
+                  for i, (c, t) in enumerate(zip(news_cat, title_pick), 1)],
+        'category': pd.Categorical.from_codes(news_cat, CATEGORIES),
+        'publish_time': _day_labels(now, rng.integers(0, 31, size=n_news), '%Y-%m-%d')
+    })
+
+    # 行为：先确定每条行为属于哪个用户
+    counts = rng.integers(config['min_behaviors'], config['max_behaviors'] + 1, size=n_users)
+    if n_behaviors is not None:
+        counts = rng.multinomial(n_behaviors, counts / counts.sum())
+    event_user = np.repeat(np.arange(n_users), counts)
+    n_events = len(event_user)
+
+    # 兴趣内行为：在用户兴趣中随机选类别，再在该类别新闻中随机选一条
+    slot = (rng.random(n_events) * interest_k[event_user]).astype(np.int64)
+    event_cat = interest_table[event_user, slot]
+    cat_order = np.argsort(news_cat, kind='stable')
+    cat_count = np.bincount(news_cat, minlength=n_cat)
+    cat_start = np.cumsum(cat_count) - cat_count
+    pos = (rng.random(n_events) * cat_count[event_cat]).astype(np.int64)
+    in_cat_item = cat_order[np.minimum(cat_start[event_cat] + pos, n_news - 1)]
+    # 兴趣外行为：在全部新闻中随机选
+    any_item = rng.integers(0, n_news, size=n_events)
+    in_interest = rng.random(n_events) < config['interest_prob']
+    event_item = np.where(in_interest, in_cat_item, any_item)
+    # 与逐条生成一致：兴趣类别下没有新闻时丢弃该行为
+    keep = ~in_interest | (cat_count[event_cat] > 0)
+
+    is_like = rng.random(n_events) < 0.25
+    behaviors_df = pd.DataFrame({
+        'user_id': event_user[keep] + 1,
+        'news_id': event_item[keep] + 1,
+        'action': pd.Categorical.from_codes(is_like[keep].astype(np.int8), ['click', 'like']),
+        'timestamp': _day_labels(now, rng.integers(0, 31, size=n_events)[keep], '%Y-%m-%d %H:%M')
+    })
+    return users_df, news_df, behaviors_df
+
+def _day_labels(now, days_ago, fmt):
+    """把“几天前”的整数数组转成日期字符串的 category 列，只格式化 31 个不同取值"""
+    labels = [(now - timedelta(days=d)).strftime(fmt) for d in range(31)]
+    return pd.Categorical.from_codes(days_ago, labels)
+
 # ========== 新增：信息茧房模拟 ==========
 
-def simulate_echo_chamber(user_id, users_df, news_df, behaviors_df, iterations=5):
-    """模拟信息茧房形成过程"""
-    # 复制行为数据，避免修改原数据
-    behaviors_copy = behaviors_df.copy()
+@instrumented()
+def simulate_echo_chamber(user_id, users_df, news_df, behaviors_df, iterations=5, incremental=True, model=None,
+                          algorithm='user_cf'):
+    """模拟信息茧房形成过程
+
+    incremental=True 时只构建一次模型，每步点击后只增量更新受影响的矩阵单元格、范数与相似度；
+    incremental=False 时沿用每步重建矩阵与模型的做法。
+    model 为已构建好的模型（如缓存中的模型）时在其副本上模拟，不会修改原模型；
+    否则按 algorithm 构建模型
+    """
     results = []
+    if incremental:
+        if model is not None:
+            model = model.copy()
+        else:
+            model = build_model(build_user_item_matrix(users_df, news_df, behaviors_df), algorithm)
+    else:
+        # 复制行为数据，避免修改原数据
+        behaviors_copy = behaviors_df.copy()
 
     for i in range(iterations):
-        # 构建矩阵
-        matrix = build_user_item_matrix(users_df, news_df, behaviors_copy)
-        similarity = calculate_user_similarity(matrix)
+        if not incremental:
+            # 用当前行为重建矩阵与模型
+            model = build_model(build_user_item_matrix(users_df, news_df, behaviors_copy), algorithm)
 
         # 生成推荐
-        _, recommendations = recommend_for_user(user_id, similarity, matrix, news_df, top_n=10)
+        _, recommendations = model.recommend(user_id, news_df, top_n=10)
 
         # 统计类别分布
         categories = [cat for _, _, cat, _ in recommendations]
         category_dist = {}
         for cat in ['科技', '体育', '娱乐', '财经', '时政']:
             count = categories.count(cat)
-            category_dist[cat] = int(count / len(categories) * 100)
+            category_dist[cat] = int(count / len(categories) * 100) if categories else 0
 
         # 用户"点击"第一条推荐
         if recommendations:
@@ -241,13 +510,16 @@ def simulate_echo_chamber(user_id, users_df, news_df, behaviors_df, iterations=5
             top_rec = f"{clicked_news[1]} ({clicked_news[2]})"
 
             # 添加新行为
-            new_behavior = {
-                'user_id': user_id,
-                'news_id': clicked_news[0],
-                'action': 'click',
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M')
-            }
-            behaviors_copy = pd.concat([behaviors_copy, pd.DataFrame([new_behavior])], ignore_index=True)
+            if incremental:
+                model.add_behavior(user_id, clicked_news[0], 'click')
+            else:
+                new_behavior = {
+                    'user_id': user_id,
+                    'news_id': clicked_news[0],
+                    'action': 'click',
+                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M')
+                }
+                behaviors_copy = pd.concat([behaviors_copy, pd.DataFrame([new_behavior])], ignore_index=True)
         else:
             top_rec = "无推荐"
 
@@ -255,59 +527,2456 @@ def simulate_echo_chamber(user_id, users_df, news_df, behaviors_df, iterations=5
 
     return results
 
+# ========== 新增：群体信息茧房模拟 ==========
+
+@instrumented()
+def simulate_population(users_df, news_df, behaviors_df, rounds=20, cohort=None, top_n=10, top_k=5,
+                        algorithm='user_cf', n_workers=1, seed=42):
+    """群体信息茧房模拟：每一轮所有用户（或抽样的 cohort）各点击自己推荐列表的第一条
+
+    每轮对整批用户做一次批量打分；用户协同过滤时可用 n_workers 个进程分片计算，
+    矩阵通过共享内存传给子进程。cohort 为 None 表示全体用户，为整数表示随机抽样人数，
+    也可以直接给出用户 ID 列表。其他算法在本进程内用模型的批量推荐与增量更新完成。
+
+    返回 DataFrame，每轮一行：各类别在推荐列表中的平均占比(%) 与平均集中度 HHI（0~1，越大越集中）
+    """
+    matrix = build_user_item_matrix(users_df, news_df, behaviors_df)
+    user_ids = users_df['user_id'].to_numpy()
+    if cohort is None:
+        cohort_ids = user_ids
+    elif np.isscalar(cohort):
+        rng = np.random.default_rng(seed)
+        cohort_ids = np.sort(rng.choice(user_ids, size=min(int(cohort), len(user_ids)), replace=False))
+    else:
+        cohort_ids = np.asarray(cohort)
+    user_index, _ = _matrix_index(matrix)
+    rows = user_index.index_of(cohort_ids)
+
+    catalog = item_catalog(news_df, matrix)
+    item_cats = catalog.category_codes
+
+    if algorithm == 'user_cf':
+        step = _PopulationUserCF(matrix, top_k, top_n, n_workers)
+    else:
+        step = _PopulationModel(build_model(matrix, algorithm), news_df, top_n)
+
+    history = []
+    try:
+        for r in range(rounds):
+            top = step.recommend(rows)
+            history.append(_category_shares(top, item_cats, catalog.category_names, r + 1))
+            # 每个有推荐的用户点击第一条
+            clicked = top[:, 0] >= 0
+            step.click(rows[clicked], top[clicked, 0])
+    finally:
+        step.close()
+    return pd.DataFrame(history)
+
+def _category_shares(top, item_cats, category_names, round_no):
+    """统计一轮推荐结果：各类别平均占比(%) 与每个用户类别分布的 HHI 均值
+
+    item_cats 为列下标到 category_names 下标的编码，编码为 -1（类别缺失）的新闻不计入
+    """
+    n_cat = len(category_names)
+    valid = top >= 0
+    valid[valid] = item_cats[top[valid]] >= 0
+    user_idx = np.repeat(np.arange(top.shape[0]), top.shape[1])[valid.ravel()]
+    cats = item_cats[top[valid]]
+    counts = np.zeros((top.shape[0], n_cat))
+    np.add.at(counts, (user_idx, cats), 1)
+    totals = counts.sum(axis=1)
+    has_rec = totals > 0
+    shares = counts[has_rec] / totals[has_rec, None]
+    row = {'轮次': round_no}
+    mean_shares = shares.mean(axis=0) if len(shares) else np.zeros(n_cat)
+    for cat, share in zip(category_names, mean_shares):
+        row[cat] = float(share * 100)
+    row['集中度'] = float((shares ** 2).sum(axis=1).mean()) if len(shares) else 0.0
+    return row
+
+class _PopulationUserCF:
+    """群体模拟中的用户协同过滤：每轮对整批用户重选邻居、批量打分；n_workers>1 时按进程分片"""
+
+    def __init__(self, matrix, top_k, top_n, n_workers):
+        self.matrix = matrix
+        self.top_k = min(top_k, matrix.shape[0] - 1)
+        self.top_n = min(top_n, matrix.shape[1])
+        self.pool = ProcessPoolExecutor(n_workers) if n_workers > 1 else None
+        self.n_workers = n_workers
+
+    def recommend(self, rows):
+        normed = normalize(self.matrix)
+        if self.pool is None:
+            return _population_shard(self.matrix, normed, rows, self.top_k, self.top_n)
+
+        # 矩阵放入共享内存，子进程只接收名字与形状
+        arrays = {'data': self.matrix.data, 'normed': normed.data.astype(np.float32),
+                  'indices': self.matrix.indices, 'indptr': self.matrix.indptr}
+        shms, specs = _to_shared(arrays)
+        try:
+            shards = np.array_split(rows, self.n_workers)
+            futures = [
+                self.pool.submit(_population_worker, specs, self.matrix.shape, shard, self.top_k, self.top_n)
+                for shard in shards if len(shard)
+            ]
+            return np.vstack([f.result() for f in futures])
+        finally:
+            for shm in shms:
+                shm.close()
+                shm.unlink()
+
+    def click(self, rows, cols):
+        clicks = sparse.csr_matrix(
+            (np.full(len(rows), ACTION_WEIGHTS['click'], dtype=np.float32), (rows, cols)),
+            shape=self.matrix.shape
+        )
+        self.matrix = self.matrix.maximum(clicks).tocsr()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+class _PopulationModel:
+    """群体模拟中的其他算法：用模型的批量推荐打分，点击通过 add_behavior 增量更新"""
+
+    def __init__(self, model, news_df, top_n):
+        self.model = model
+        self.news_df = news_df
+        self.top_n = top_n
+
+    def recommend(self, rows):
+        ids, _ = self.model.recommend_users(self.model.user_index.id_of(rows), self.news_df, top_n=self.top_n)
+        top = self.model.item_index.get_indexer(ids)
+        top[ids == -1] = -1
+        return top
+
+    def click(self, rows, cols):
+        self.model.add_behaviors(self.model.user_index.id_of(rows), self.model.item_index.id_of(cols),
+                                 weights=np.full(len(rows), ACTION_WEIGHTS['click'], dtype=np.float32))
+
+    def close(self):
+        pass
+
+def _population_shard(matrix, normed, rows, top_k, top_n):
+    """一组用户：重选 Top-K 邻居、加权打分、屏蔽已看、取 Top-N，返回物品下标（无推荐处为 -1）"""
+    b = len(rows)
+    if top_k == 0:
+        # 只有一个用户（或 top_k=0）时没有邻居，不产生推荐
+        return np.full((b, top_n), -1, dtype=np.int64)
+    nbr_idx, nbr_sims = _topk_rows(normed, normed.T.tocsr(), rows, top_k)
+    weights = sparse.csr_matrix(
+        (nbr_sims.ravel(), nbr_idx.ravel(), np.arange(0, b * top_k + 1, top_k)),
+        shape=(b, matrix.shape[0])
+    )
+    scores = (weights @ matrix).toarray()
+    _mask_seen(scores, matrix[rows])
+    top, top_scores = _top_n(scores, top_n)
+    return np.where(top_scores > 0, top, -1)
+
+def _population_worker(specs, shape, rows, top_k, top_n):
+    """子进程入口：挂载共享内存中的矩阵后计算一个分片"""
+    shms, arrays = _attach_shared(specs)
+    try:
+        matrix = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=shape, copy=False)
+        normed = sparse.csr_matrix((arrays['normed'], arrays['indices'], arrays['indptr']), shape=shape, copy=False)
+        return _population_shard(matrix, normed, rows, top_k, top_n)
+    finally:
+        # 先释放所有指向共享内存的视图，才能关闭
+        matrix = normed = None
+        arrays.clear()
+        for shm in shms:
+            shm.close()
+
+def _to_shared(arrays):
+    """把数组复制到新建的共享内存，返回 (共享内存对象列表, 可传给子进程的描述)"""
+    shms, specs = [], {}
+    for key, arr in arrays.items():
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        shms.append(shm)
+        specs[key] = (shm.name, arr.dtype.str, arr.shape)
+    return shms, specs
+
+def _attach_shared(specs):
+    shms, arrays = [], {}
+    for key, (name, dtype, shape) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        shms.append(shm)
+        arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    return shms, arrays
+
+# ========== 新增：ID 索引 ==========
+
+class IdIndex:
+    """外部 ID ↔ 连续下标的双向映射：ids[i] 是第 i 行（列）的外部 ID
+
+    ID 为连续整数时按偏移量直接换算，否则用哈希索引向量化查找，都是 O(1)/个
+    """
+
+    def __init__(self, ids):
+        self.ids = np.asarray(ids)
+        self._offset = None
+        self._index = None
+        n = len(self.ids)
+        if (n and np.issubdtype(self.ids.dtype, np.integer)
+                and int(self.ids[-1]) - int(self.ids[0]) == n - 1
+                and (n == 1 or bool((np.diff(self.ids) == 1).all()))):
+            self._offset = int(self.ids[0])
+        else:
+            self._index = pd.Index(self.ids)
+            if not self._index.is_unique:
+                raise ValueError("ID 存在重复")
+
+    @classmethod
+    def identity(cls, n):
+        """默认约定：ID 从 1 开始连续编号"""
+        return cls(np.arange(1, n + 1))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_indexer(self, ids):
+        """外部 ID 数组转下标，不存在的 ID 为 -1"""
+        ids = np.asarray(ids)
+        if self._index is not None:
+            return self._index.get_indexer(ids.ravel()).reshape(ids.shape)
+        if not np.issubdtype(ids.dtype, np.integer):
+            return pd.Index(self.ids).get_indexer(ids.ravel()).reshape(ids.shape)
+        pos = ids.astype(np.int64) - self._offset
+        return np.where((pos >= 0) & (pos < len(self.ids)), pos, -1)
+
+    def index_of(self, ids):
+        """外部 ID（标量或数组）转下标，存在未知 ID 时抛出 KeyError"""
+        pos = self.get_indexer(ids)
+        if (pos < 0).any():
+            missing = np.asarray(ids)[pos < 0] if np.ndim(ids) else ids
+            raise KeyError(f"未知的 ID: {np.atleast_1d(missing)[:5].tolist()}")
+        return int(pos) if np.ndim(pos) == 0 else pos
+
+    def id_of(self, positions):
+        """下标转外部 ID"""
+        return self.ids[positions]
+
+class ItemCatalog:
+    """新闻元数据的平行数组（ID、标题、类别、类别编码），按列下标一次花式索引取出整批推荐结果
+
+    category_names 为 CATEGORIES 加上数据中出现的其他类别（按出现顺序），category_codes 是其下标；
+    类别缺失的新闻编码为 -1
+    """
+
+    def __init__(self, news_df):
+        self.index = IdIndex(news_df['news_id'].to_numpy())
+        self.ids = self.index.ids
+        self.titles = news_df['title'].to_numpy(dtype=object)
+        self.categories = news_df['category'].to_numpy(dtype=object)
+        present = pd.unique(news_df['category'].dropna().astype(object))
+        self.category_names = CATEGORIES + [cat for cat in present if cat not in CATEGORIES]
+        self.category_codes = pd.Categorical(news_df['category'], categories=self.category_names).codes.astype(np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def recommendations(self, top, reasons):
+        """组装成 (news_id, 标题, 类别, 推荐理由) 列表"""
+        return list(zip(self.ids[top], self.titles[top], self.categories[top], reasons))
+
+def item_catalog(news_df, matrix=None):
+    """取 news_df 对应的 ItemCatalog
+
+    matrix 为由该 news_df 构建的用户-物品矩阵时，直接复用附在矩阵上的 catalog（与 item_index 一起构建），
+    否则按 news_df 当前内容重新构建
+    """
+    catalog = getattr(matrix, 'catalog', None)
+    if catalog is None or len(catalog) != len(news_df):
+        catalog = ItemCatalog(news_df)
+    return catalog
+
+def _matrix_index(matrix):
+    """用户-物品矩阵的 (用户索引, 物品索引)；矩阵未附带索引时按 ID 从 1 连续编号处理"""
+    user_index = getattr(matrix, 'user_index', None)
+    item_index = getattr(matrix, 'item_index', None)
+    if user_index is None:
+        user_index = IdIndex.identity(matrix.shape[0])
+    if item_index is None:
+        item_index = IdIndex.identity(matrix.shape[1])
+    return user_index, item_index
+
+def _attach_index(matrix, user_index, item_index, catalog=None):
+    matrix.user_index = user_index
+    matrix.item_index = item_index
+    matrix.catalog = catalog
+    return matrix
+
 # ========== 其他函数（保持不变） ==========
 
+@instrumented()
 def save_dataset(users_df, news_df, behaviors_df):
     users_df.to_csv('data_users.csv', index=False)
     news_df.to_csv('data_news.csv', index=False)
     behaviors_df.to_csv('data_behaviors.csv', index=False)
 
+@instrumented()
 def load_dataset():
     try:
         users_df = pd.read_csv('data_users.csv')
         news_df = pd.read_csv('data_news.csv')
         behaviors_df = pd.read_csv('data_behaviors.csv')
-        users_df['interests'] = users_df['interests'].apply(eval)
-        return users_df, news_df, behaviors_df
-    except:
+    except FileNotFoundError:
         return None, None, None
+    users_df['interests'] = users_df['interests'].apply(ast.literal_eval)
+    return users_df, news_df, behaviors_df
 
-def build_user_item_matrix(users_df, news_df, behaviors_df):
-    matrix = np.zeros((len(users_df), len(news_df)))
-    for _, b in behaviors_df.iterrows():
-        u_idx = b['user_id'] - 1
-        n_idx = b['news_id'] - 1
-        matrix[u_idx][n_idx] = 1 if b['action'] == 'click' else 2
-    return matrix
+# 行为权重：点击=1，点赞=2
+ACTION_WEIGHTS = {'click': 1, 'like': 2}
+
+@instrumented()
+def build_user_item_matrix(users_df, news_df, behaviors_df, agg='max', half_life=None, now=None):
+    """一次向量化遍历行为列，直接构建 CSR 稀疏用户-物品矩阵
+
+    同一用户对同一新闻的重复行为按 agg 合并：'max' 取最大权重，'sum' 累加权重。
+    half_life（秒）不为 None 时按 timestamp 指数衰减：权重 × 2^(-(now - t)/half_life)，
+    now 默认取最新一条行为的时间。
+    行、列顺序与 users_df、news_df 一致，ID 与下标的映射以 user_index、item_index 属性附在矩阵上，
+    新闻元数据以 catalog 属性附在矩阵上
+    """
+    user_index = IdIndex(users_df['user_id'].to_numpy())
+    catalog = item_catalog(news_df)
+    item_index = catalog.index
+    rows = user_index.index_of(behaviors_df['user_id'].to_numpy())
+    cols = item_index.index_of(behaviors_df['news_id'].to_numpy())
+    values = _action_weights(behaviors_df['action'])
+    if half_life is not None and len(values):
+        epochs = _to_epoch(behaviors_df['timestamp'])
+        values = values * _decay_factor(epochs, epochs.max() if now is None else now, half_life)
+    matrix = _to_csr(rows, cols, values, (len(users_df), len(news_df)), agg)
+    return _attach_index(matrix, user_index, item_index, catalog)
+
+def _action_weights(actions):
+    """行为类型转权重：click=1，其余=2；category 列只比较类别再按编码取值"""
+    if isinstance(actions.dtype, pd.CategoricalDtype):
+        cat_weights = np.where(actions.cat.categories == 'click',
+                               ACTION_WEIGHTS['click'], ACTION_WEIGHTS['like']).astype(np.float32)
+        return cat_weights[actions.cat.codes.to_numpy()]
+    return np.where(actions.to_numpy() == 'click',
+                    ACTION_WEIGHTS['click'], ACTION_WEIGHTS['like']).astype(np.float32)
+
+def _decay_factor(epochs, anchor, half_life):
+    """时间衰减系数 2^((t - anchor)/half_life)，float32"""
+    return np.exp2((np.asarray(epochs, dtype=np.float64) - anchor) / half_life).astype(np.float32)
+
+def _to_csr(rows, cols, values, shape, agg='max'):
+    """把 (行, 列, 值) 三元组合并为 CSR 矩阵，重复坐标按 agg 合并"""
+    if agg == 'sum':
+        matrix = sparse.csr_matrix((values, (rows, cols)), shape=shape)
+        matrix.sum_duplicates()
+        return matrix
+    if agg != 'max':
+        raise ValueError(f"未知的合并方式: {agg}")
+
+    # 按线性坐标排序后分段取最大值
+    keys = rows * shape[1] + cols
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    if len(keys):
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        values = np.maximum.reduceat(values[order], starts)
+        keys = keys[starts]
+    else:
+        values = values[order]
+    rows, cols = np.divmod(keys, shape[1])
+    return sparse.csr_matrix((values, (rows, cols)), shape=shape)
+
+# 近邻索引默认保存的邻居数
+DEFAULT_NEIGHBORS = 20
+
+@instrumented()
+def calculate_user_similarity(matrix, k=None, block_size=512, path=None):
+    """用户余弦相似度
+
+    k 为 None 时返回完整的 U×U 稠密相似度矩阵（给定 path 时分块计算并落盘，返回只读内存映射）；
+    给定 k 时返回只保存 Top-K 邻居的 NeighborIndex
+    """
+    if k is None:
+        if path is not None:
+            return blocked_similarity(matrix, path)
+        return cosine_similarity(matrix)
+    return build_neighbor_index(matrix, k=k, block_size=block_size)
+
+class NeighborIndex:
+    """Top-K 近邻索引：每个用户只保存 K 个最相似的其他用户（按相似度降序）"""
+
+    def __init__(self, indices, scores):
+        self.indices = indices  # (U, K) int32，邻居的行号
+        self.scores = scores    # (U, K) float32，对应的余弦相似度
+
+    @property
+    def k(self):
+        return self.indices.shape[1]
+
+    @property
+    def shape(self):
+        return self.indices.shape
+
+    def __len__(self):
+        return self.indices.shape[0]
+
+    def neighbors(self, row, top_k=None):
+        """返回某一行的前 top_k 个邻居行号及相似度（top_k 超过 K 时只返回 K 个）"""
+        return self.indices[row, :top_k], self.scores[row, :top_k]
+
+    def update_row(self, row, sims, recompute=None):
+        """用某一行与所有行的最新相似度（长度 U）就地刷新索引，代价 O(U·K)
+
+        该行的邻居整体重选；其他行只修补涉及该行的条目：已在列表中的更新分数，
+        新分数超过第 K 名的替换第 K 名。若某行中该条目跌破原第 K 名，列表外可能有更优的候选，
+        提供 recompute(rows) -> (indices, scores) 时对这些行整体重算，否则保留近似结果。
+        返回邻居列表发生变化的行号（含该行本身）
+        """
+        affected, stale = self.patch_row(row, sims)
+        if recompute is not None and len(stale):
+            self.indices[stale], self.scores[stale] = recompute(stale)
+        return affected
+
+    def update_rows(self, rows, similarities, block_size=256):
+        """批量刷新若干行：similarities(rows) 返回这些行与所有行最新相似度的 CSR (len(rows) × n)
+
+        逐行修补后，需要整体重算的行去重，按块用整批更新后的相似度统一重算一次。
+        返回邻居列表发生变化的行号
+        """
+        affected, stale = [np.asarray(rows)], []
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            sims = similarities(block).toarray()
+            for j, row in enumerate(block):
+                changed, lost = self.patch_row(row, sims[j])
+                affected.append(changed)
+                stale.append(lost)
+        stale = np.unique(np.concatenate(stale)) if stale else np.empty(0, dtype=np.int64)
+        for start in range(0, len(stale), block_size):
+            block = stale[start:start + block_size]
+            self.indices[block], self.scores[block] = _topk_sparse(similarities(block), block, self.k)
+        return np.unique(np.concatenate(affected))
+
+    def patch_row(self, row, sims):
+        """update_row 的修补部分，不做重算：返回 (邻居列表变化的行号, 需要整体重算的行号)"""
+        sims = np.asarray(sims, dtype=np.float32).copy()
+        sims[row] = -np.inf
+        k = self.k
+        if k == 0:
+            return np.array([row]), np.empty(0, dtype=np.int64)
+        old_min = self.scores[:, -1].copy()
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind='stable')]
+        self.indices[row] = top
+        self.scores[row] = sims[top]
+
+        # 列表中含该行的条目（平铺后查找，比二维布尔掩码的逐行归约快）
+        flat = np.flatnonzero(self.indices.reshape(-1) == row)
+        holders = flat // k
+        self.scores[holders, flat % k] = sims[holders]
+        has_row = np.zeros(len(sims), dtype=bool)
+        has_row[holders] = True
+        enters = ~has_row & (sims > self.scores[:, -1])
+        enters[row] = False
+        self.indices[enters, -1] = row
+        self.scores[enters, -1] = sims[enters]
+
+        affected = np.flatnonzero(has_row | enters)
+        affected = affected[affected != row]
+        if len(affected):
+            order = np.argsort(-self.scores[affected], axis=1, kind='stable')
+            self.indices[affected] = np.take_along_axis(self.indices[affected], order, axis=1)
+            self.scores[affected] = np.take_along_axis(self.scores[affected], order, axis=1)
+
+        stale = np.flatnonzero(has_row & (sims < old_min))
+        return np.union1d(affected, [row]), stale
+
+    def copy(self):
+        return NeighborIndex(self.indices.copy(), self.scores.copy())
+
+@instrumented()
+def build_neighbor_index(matrix, k=DEFAULT_NEIGHBORS, block_size=512):
+    """分块计算余弦相似度，用 argpartition 只保留每行 Top-K，峰值内存约为 block_size×U"""
+    normed = normalize(sparse.csr_matrix(matrix, dtype=np.float32))
+    normed_t = normed.T.tocsr()
+    n = normed.shape[0]
+    k = max(min(k, n - 1), 0)
+    indices = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float32)
+    if k == 0:
+        return NeighborIndex(indices, scores)
+
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        indices[start:stop], scores[start:stop] = _topk_rows(normed, normed_t, np.arange(start, stop), k)
+    return NeighborIndex(indices, scores)
+
+def _topk_rows(normed, normed_t, rows, k):
+    """计算若干行与所有行的余弦相似度并取 Top-K（排除自身），按相似度降序返回 (行号, 相似度)"""
+    n = normed.shape[0]
+    if k <= 0:
+        return np.empty((len(rows), 0), dtype=np.int64), np.empty((len(rows), 0), dtype=np.float32)
+    block = (normed[rows] @ normed_t).toarray()
+    block[np.arange(len(rows)), rows] = -np.inf
+    # 直接对 block 取最大的 k 列，避免整块取负产生的副本
+    part = np.argpartition(block, n - k, axis=1)[:, n - k:]
+    part_scores = np.take_along_axis(block, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+def _topk_sparse(block, rows, k):
+    """block 为若干行与所有行相似度的 CSR (len(rows) × n)，排除自身后取 Top-K，按相似度降序返回 (行号, 相似度)
+
+    只在非零相似度中排序，代价与非零元个数有关；不足 K 个时用相似度为 0 的行补齐
+    """
+    indices = np.empty((len(rows), k), dtype=np.int64)
+    scores = np.zeros((len(rows), k), dtype=np.float32)
+    for i, row in enumerate(rows):
+        cols = block.indices[block.indptr[i]:block.indptr[i + 1]]
+        sims = block.data[block.indptr[i]:block.indptr[i + 1]]
+        keep = (cols != row) & (sims > 0)
+        cols, sims = cols[keep], sims[keep]
+        top = np.argpartition(-sims, k - 1)[:k] if len(sims) > k else np.arange(len(sims))
+        top = top[np.argsort(-sims[top], kind='stable')]
+        m = len(top)
+        indices[i, :m], scores[i, :m] = cols[top], sims[top]
+        if m < k:
+            indices[i, m:] = np.setdiff1d(np.arange(k + m + 1), np.append(cols[top], row))[:k - m]
+    return indices, scores
+
+def _cosine_rows(dots, row_norms, col_norms):
+    """点积 CSR 就地除以对应行、列范数之积得到余弦相似度（范数为 0 的位置记 0）"""
+    denom = np.repeat(row_norms, np.diff(dots.indptr)) * col_norms[dots.indices]
+    dots.data = np.divide(dots.data, denom, out=np.zeros_like(dots.data), where=denom > 0)
+    return dots
+
+def _row_dense(matrix, idx):
+    """取出矩阵的一行并转为一维稠密数组（兼容稀疏矩阵）"""
+    row = matrix[idx]
+    if sparse.issparse(row):
+        return row.toarray().ravel()
+    return np.asarray(row).ravel()
+
+@instrumented()
+def recommend_for_user(user_id, similarity, matrix, news_df, top_k=5, top_n=10, candidates=None):
+    """similarity 可以是完整相似度矩阵，也可以是 NeighborIndex（直接查询 Top-K 邻居）
+
+    candidates 为候选物品的列下标（如 CandidateIndex.candidates() 的结果）时只在候选集内打分排序
+    """
+    user_index, _ = _matrix_index(matrix)
+    u_idx = user_index.index_of(user_id)
+    if isinstance(similarity, NeighborIndex):
+        similar_indices, neighbor_sims = similarity.neighbors(u_idx, top_k)
+    else:
+        sims = similarity[u_idx]
+        similar_indices = np.argsort(sims)[::-1][1:top_k+1]
+        neighbor_sims = sims[similar_indices]
+    similar_users = list(zip(user_index.id_of(similar_indices), neighbor_sims))
+
+    candidates = _as_candidates(candidates)
+    if candidates is None:
+        # 近邻行按相似度加权求和（稀疏矩阵只取这几行，不转稠密）
+        scores = np.asarray(matrix[similar_indices].T @ neighbor_sims, dtype=np.float64).ravel()
+
+        user_watched = np.where(_row_dense(matrix, u_idx) > 0)[0]
+        scores[user_watched] = -1
+
+        top_indices = np.argsort(scores)[::-1][:top_n]
+        top_indices = top_indices[scores[top_indices] > 0]
+    else:
+        # 只在候选列上累加近邻得分，代价与候选集大小有关、与物品总数无关
+        neighbors = _restrict_columns(sparse.csr_matrix(matrix[similar_indices]), candidates)
+        scores = np.asarray(neighbors.T @ neighbor_sims, dtype=np.float64)[None, :]
+        top_indices, _ = _rank_row(scores, sparse.csr_matrix(matrix[u_idx]), top_n, candidates)
+
+    recommender = similar_users[0][0] if similar_users else user_id
+    recommendations = item_catalog(news_df, matrix).recommendations(
+        top_indices, [f"用户{recommender}喜欢此类内容"] * len(top_indices)
+    )
+    return similar_users, recommendations
+
+# ========== 新增：批量推荐 ==========
+
+@instrumented()
+def recommend_for_users(user_ids, similarity, matrix, news_df, top_k=5, top_n=10, block_size=1024,
+                        candidates=None):
+    """批量推荐：每个用户块做一次稀疏矩阵乘法打分，向量化屏蔽已看内容，argpartition 取 Top-N
+
+    返回 (news_ids, scores) 两个 (len(user_ids), top_n) 数组，按得分降序；
+    得分不为正的位置 news_id 填 -1、得分填 0。candidates 为所有用户共用的候选列下标
+    """
+    rows = _matrix_index(matrix)[0].index_of(np.asarray(user_ids))
+    catalog = item_catalog(news_df, matrix)
+    if not isinstance(matrix, _DeltaMatrix):
+        matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    candidates = _as_candidates(candidates)
+    return _rank_blocks(rows, lambda block: _score_block(block, similarity, matrix, top_k, candidates),
+                        matrix, catalog, top_n, block_size, candidates)
+
+def _rank_blocks(rows, score_fn, matrix, catalog, top_n, block_size=1024, candidates=None):
+    """按块调用 score_fn 得到 (块大小 × I) 得分，屏蔽已看后取 Top-N，返回 (news_ids, scores)
+
+    candidates 给定时 score_fn 只返回候选列的得分 (块大小 × 候选数)
+    """
+    top_n = min(top_n, matrix.shape[1] if candidates is None else len(candidates))
+    news_ids = catalog.ids
+
+    out_ids = np.full((len(rows), top_n), -1, dtype=news_ids.dtype)
+    out_scores = np.zeros((len(rows), top_n), dtype=np.float32)
+    if top_n == 0:
+        return out_ids, out_scores
+
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        scores = score_fn(block)
+        seen = matrix[block] if candidates is None else _restrict_columns(matrix[block], candidates)
+        _mask_seen(scores, seen)
+        top, top_scores = _top_n(scores, top_n)
+        if candidates is not None:
+            top = candidates[top]
+        valid = top_scores > 0
+        out_ids[start:start + len(block)] = np.where(valid, news_ids[top], -1)
+        out_scores[start:start + len(block)] = np.where(valid, top_scores, 0)
+    return out_ids, out_scores
+
+def _neighbor_block(similarity, rows, top_k):
+    """取一批用户的 Top-K 邻居行号与相似度，形状均为 (len(rows), K)"""
+    if isinstance(similarity, NeighborIndex):
+        return similarity.indices[rows, :top_k], similarity.scores[rows, :top_k]
+    sims = np.array(similarity[rows], dtype=np.float32)
+    # 排除自身
+    sims[np.arange(len(rows)), rows] = -np.inf
+    top_k = min(top_k, sims.shape[1] - 1)
+    if top_k <= 0:
+        return np.empty((len(rows), 0), dtype=np.int64), np.empty((len(rows), 0), dtype=np.float32)
+    return _top_n(sims, top_k)
+
+def _score_block(rows, similarity, matrix, top_k, candidates=None):
+    """把邻居相似度组装成稀疏权重矩阵 (块大小 × 邻居数)，一次乘法得到块内所有用户的物品得分
+
+    只取出块内用户的邻居行参与乘法（matrix 也可以是带待合并增量的 _DeltaMatrix）；
+    candidates 给定时邻居行先截到候选列
+    """
+    nbr_idx, nbr_sims = _neighbor_block(similarity, rows, top_k)
+    b, k = nbr_idx.shape
+    if k == 0:
+        # 没有邻居（top_k=0 或只有一个用户）：所有物品得分为 0，不产生推荐
+        return np.zeros((b, matrix.shape[1] if candidates is None else len(candidates)), dtype=np.float32)
+    neighbors, local = np.unique(nbr_idx.ravel(), return_inverse=True)
+    scored = matrix[neighbors] if candidates is None else _restrict_columns(matrix[neighbors], candidates)
+    weights = sparse.csr_matrix(
+        (nbr_sims.ravel(), local.ravel(), np.arange(0, b * k + 1, k)),
+        shape=(b, len(neighbors))
+    )
+    return (weights @ scored).toarray()
+
+def _mask_seen(scores, seen):
+    """把用户已交互过的物品得分置为 -inf（seen 为对应行的 CSR 子矩阵）"""
+    block_rows = np.repeat(np.arange(seen.shape[0]), np.diff(seen.indptr))
+    positive = seen.data > 0
+    scores[block_rows[positive], seen.indices[positive]] = -np.inf
+
+def _top_n(scores, n):
+    """逐行取得分最高的 n 个位置（argpartition 后只对这 n 个排序）"""
+    part = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+# ========== 新增：增量更新模型 ==========
+
+# 模型版本号：每个模型实例、每次全量重训或整体缩放都取一个新值，推荐结果缓存以此区分模型状态
+_MODEL_VERSIONS = itertools.count(1)
+
+# 待合并增量的单元格数超过 max(PENDING_MIN, 基础矩阵 nnz // PENDING_RATIO) 时并入基础矩阵
+PENDING_MIN = 1 << 12
+PENDING_RATIO = 16
+
+class _DeltaMatrix:
+    """基础 CSR 矩阵 + 待合并增量：写入先记在按 (行, 列) 排序的小数组里，读取时叠加到基础矩阵上
+
+    每批写入只改动增量数组，代价与批大小和增量大小有关、与历史总量无关；增量超过阈值时
+    才一次性并入基础矩阵（O(nnz)，均摊到每个单元格为常数）。[rows] 取已叠加增量的行，
+    columns(cols) 取转置（物品-用户）的行，转置在首次使用时建立，此后随合并同步更新
+    """
+
+    def __init__(self, base):
+        self.user_index, self.item_index = _matrix_index(base)
+        self.catalog = getattr(base, 'catalog', None)
+        self.base = base
+        self._base_t = None
+        self._keys = np.empty(0, dtype=np.int64)    # 行号 × 列数 + 列号，升序
+        self._diff = np.empty(0, dtype=np.float32)  # 当前取值 - 基础矩阵中的取值
+        self._delta = None                          # 增量的 CSR 及其转置，写入后失效
+        self._delta_t = None
+
+    @property
+    def shape(self):
+        return self.base.shape
+
+    @property
+    def pending(self):
+        """尚未并入基础矩阵的单元格数"""
+        return len(self._keys)
+
+    def get(self, rows, cols):
+        """若干单元格的当前取值"""
+        values = np.asarray(self.base[rows, cols], dtype=np.float32).ravel()
+        if len(self._keys):
+            pos, hit = self._find(rows, cols)
+            values[hit] += self._diff[pos[hit]]
+        return values
+
+    def add(self, rows, cols, diff):
+        """把若干互不重复单元格的变化量记入增量，超过阈值时并入基础矩阵"""
+        if len(rows) == 0:
+            return
+        diff = np.asarray(diff, dtype=np.float32)
+        pos, hit = self._find(rows, cols)
+        self._diff[pos[hit]] += diff[hit]
+        if not hit.all():
+            keys = np.asarray(rows, dtype=np.int64)[~hit] * self.shape[1] + cols[~hit]
+            order = np.argsort(keys)
+            self._keys = np.insert(self._keys, pos[~hit][order], keys[order])
+            self._diff = np.insert(self._diff, pos[~hit][order], diff[~hit][order])
+        self._delta = self._delta_t = None
+        if len(self._keys) > max(PENDING_MIN, self.base.nnz // PENDING_RATIO):
+            self.merge()
+
+    def _find(self, rows, cols):
+        """单元格在增量数组中的位置及是否已存在"""
+        keys = np.asarray(rows, dtype=np.int64) * self.shape[1] + cols
+        pos = np.searchsorted(self._keys, keys)
+        hit = pos < len(self._keys)
+        hit[hit] = self._keys[pos[hit]] == keys[hit]
+        return pos, hit
+
+    def _deltas(self):
+        """增量的 CSR 与转置 CSR（键已按行、列排序，直接构造 indptr）"""
+        if self._delta is None:
+            n_rows, n_cols = self.shape
+            rows, cols = np.divmod(self._keys, n_cols)
+            indptr = np.zeros(n_rows + 1, dtype=np.int64)
+            np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+            self._delta = sparse.csr_matrix((self._diff, cols, indptr), shape=self.shape)
+            self._delta_t = self._delta.T.tocsr()
+        return self._delta, self._delta_t
+
+    def __getitem__(self, rows):
+        """取若干行（已叠加增量）的 CSR 子矩阵，整数下标返回 1×I"""
+        block = self.base[rows]
+        if len(self._keys):
+            block = block + self._deltas()[0][rows]
+        return block
+
+    def columns(self, cols):
+        """取转置（物品-用户）矩阵的若干行（已叠加增量）"""
+        if self._base_t is None:
+            self._base_t = self.base.T.tocsr()
+        block = self._base_t[cols]
+        if len(self._keys):
+            block = block + self._deltas()[1][cols]
+        return block
+
+    def dot_t(self, x):
+        """x @ Mᵀ（x 为 n × I 的 CSR），代价只与 x 涉及的物品的交互数有关"""
+        if self._base_t is None:
+            self._base_t = self.base.T.tocsr()
+        out = x @ self._base_t
+        if len(self._keys):
+            out = out + x @ self._deltas()[1]
+        return out
+
+    def rdot(self, x):
+        """x @ M（x 为 n × U 的 CSR），代价只与 x 涉及的用户的交互数有关"""
+        out = x @ self.base
+        if len(self._keys):
+            out = out + x @ self._deltas()[0]
+        return out
+
+    def merge(self):
+        """把增量并入基础矩阵（已建立的转置一并更新），返回基础矩阵"""
+        if len(self._keys):
+            delta, delta_t = self._deltas()
+            self.base = _attach_index((self.base + delta).tocsr(), self.user_index, self.item_index, self.catalog)
+            if self._base_t is not None:
+                self._base_t = (self._base_t + delta_t).tocsr()
+            self._keys = np.empty(0, dtype=np.int64)
+            self._diff = np.empty(0, dtype=np.float32)
+            self._delta = self._delta_t = None
+        return self.base
+
+    def scale(self, factor):
+        """整体乘以 factor"""
+        factor = np.float32(factor)
+        self.base.data *= factor
+        if self._base_t is not None:
+            self._base_t.data *= factor
+        self._diff *= factor
+        self._delta = self._delta_t = None
+
+    @property
+    def nbytes(self):
+        return sum(_nbytes(m) for m in (self.base, self._base_t, self._keys, self._diff))
+
+class _InteractionModel:
+    """推荐模型基类：持有用户-物品交互矩阵并负责单元格写入，子类在 _cell_changed 中增量维护自身结构
+
+    新行为写入 interactions（_DeltaMatrix）的待合并增量，模型内部的打分与增量更新直接读取
+    叠加增量后的行列，不触发合并；matrix 属性返回合并后的 CSR 矩阵。
+    _cell_changed / _cells_changed 返回推荐结果可能变化的用户行号（None 表示全部），
+    写入行为后通知 add_listener 注册的回调
+    """
+
+    # 矩阵整体乘以常数时推荐排序是否不变（BehaviorStream 的时间衰减依赖这一性质）
+    scale_invariant = True
+
+    def __init__(self, matrix, agg='max'):
+        self.user_index, self.item_index = _matrix_index(matrix)
+        self.catalog = getattr(matrix, 'catalog', None)
+        base = _attach_index(sparse.csr_matrix(matrix, dtype=np.float32, copy=True),
+                             self.user_index, self.item_index, self.catalog)
+        base.sum_duplicates()
+        self.interactions = _DeltaMatrix(base)
+        self.agg = agg
+        self.version = next(_MODEL_VERSIONS)
+        self._listeners = []
+
+    @property
+    def matrix(self):
+        """用户-物品 CSR 矩阵（先并入待合并的增量）"""
+        return self.interactions.merge()
+
+    def add_listener(self, callback):
+        """注册行为更新回调 callback(model, rows)，rows 为推荐结果可能变化的用户行号，None 表示全部"""
+        self._listeners.append(callback)
+
+    def _notify(self, rows):
+        if rows is None:
+            self.version = next(_MODEL_VERSIONS)
+        for callback in self._listeners:
+            callback(self, rows)
+
+    @instrumented('model.add_behavior')
+    def add_behavior(self, user_id, news_id, action='click'):
+        """记录一条新行为：写入矩阵单元格，取值变化时交给子类增量更新"""
+        u_idx, n_idx = self.user_index.index_of(user_id), self.item_index.index_of(news_id)
+        weight = ACTION_WEIGHTS['click'] if action == 'click' else ACTION_WEIGHTS['like']
+        rows, cols, old, new = self._write(np.array([u_idx]), np.array([n_idx]), np.array([weight], dtype=np.float32))
+        if len(rows):
+            self._notify(self._cell_changed(rows[0], cols[0], old[0], new[0]))
+
+    @instrumented('model.add_behaviors')
+    def add_behaviors(self, user_ids, news_ids, actions=None, weights=None):
+        """批量记录行为：一次写入矩阵增量，再把取值变化的单元格整批交给子类增量更新
+
+        weights 给定时直接作为权重（如已乘上时间衰减），否则由 actions 换算；
+        批内重复的 (用户, 新闻) 先按 agg 合并。代价与批大小成正比，与历史行为总量无关
+        """
+        rows = self.user_index.index_of(np.asarray(user_ids))
+        cols = self.item_index.index_of(np.asarray(news_ids))
+        if weights is None:
+            weights = _action_weights(pd.Series(actions))
+        rows, cols, old, new = self._write(rows, cols, np.asarray(weights, dtype=np.float32))
+        if len(rows) == 0:
+            return 0
+        self._notify(self._cells_changed(rows, cols, old, new))
+        return len(rows)
+
+    def _write(self, rows, cols, weights):
+        """批内重复坐标按 agg 合并后写入，返回取值发生变化的 (行, 列, 旧值, 新值)"""
+        delta = _to_csr(rows, cols, weights, self.interactions.shape, self.agg).tocoo()
+        rows, cols = delta.row, delta.col
+        old = self.interactions.get(rows, cols) if delta.nnz else np.empty(0, dtype=np.float32)
+        new = old + delta.data if self.agg == 'sum' else np.maximum(old, delta.data)
+        changed = new != old
+        rows, cols, old, new = rows[changed], cols[changed], old[changed], new[changed]
+        self.interactions.add(rows, cols, new - old)
+        return rows, cols, old, new
+
+    def rescale(self, factor):
+        """矩阵整体乘以 factor（时间衰减换基准时使用），子类同步缩放自身结构"""
+        self.interactions.scale(factor)
+        self._rescaled(factor)
+        self._notify(None)
+
+    def _cell_changed(self, row, col, old, new):
+        raise NotImplementedError
+
+    def _cells_changed(self, rows, cols, old, new):
+        """一批单元格变化；默认逐个交给 _cell_changed，子类可整批处理"""
+        affected = [self._cell_changed(*args) for args in zip(rows, cols, old, new)]
+        if any(part is None for part in affected):
+            return None
+        return np.unique(np.concatenate(affected)) if affected else np.empty(0, dtype=np.int64)
+
+    def _rescaled(self, factor):
+        pass
+
+    @property
+    def nbytes(self):
+        """模型占用的数组内存（字节）"""
+        return sum(_nbytes(value) for value in vars(self).values())
+
+    def copy(self):
+        """深拷贝；副本取新版本号，不继承回调"""
+        clone = copy.deepcopy(self)
+        clone.version = next(_MODEL_VERSIONS)
+        return clone
+
+    def __getstate__(self):
+        # 回调（如推荐结果缓存）不随拷贝或序列化传递
+        state = self.__dict__.copy()
+        state['_listeners'] = []
+        return state
+
+def _nbytes(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if sparse.issparse(obj):
+        return obj.data.nbytes + obj.indices.nbytes + obj.indptr.nbytes
+    if isinstance(obj, NeighborIndex):
+        return obj.indices.nbytes + obj.scores.nbytes
+    if isinstance(obj, _DeltaMatrix):
+        return obj.nbytes
+    return 0
+
+class UserCFModel(_InteractionModel):
+    """用户协同过滤模型：持有用户-物品矩阵、行范数与相似度结构，支持单条行为的增量更新"""
+
+    def __init__(self, matrix, k=DEFAULT_NEIGHBORS, block_size=512, agg='max', similarity=None):
+        """similarity 为同一矩阵已算好的相似度结构（如场景快照中内存映射的近邻索引）时直接使用；
+        只读的内存映射在增量更新前需先 copy()
+        """
+        super().__init__(matrix, agg)
+        self.norms = np.sqrt(np.asarray(self.matrix.multiply(self.matrix).sum(axis=1)).ravel())
+        if similarity is None:
+            similarity = calculate_user_similarity(self.matrix, k=k, block_size=block_size)
+        self.similarity = similarity
+
+    def recommend(self, user_id, news_df, top_k=5, top_n=10, candidates=None):
+        return recommend_for_user(user_id, self.similarity, self.interactions, news_df, top_k=top_k, top_n=top_n,
+                                  candidates=candidates)
+
+    def recommend_users(self, user_ids, news_df, top_k=5, top_n=10, candidates=None):
+        return recommend_for_users(user_ids, self.similarity, self.interactions, news_df, top_k=top_k,
+                                   top_n=top_n, candidates=candidates)
+
+    def _cell_changed(self, row, col, old, new):
+        """更新该用户的范数以及该用户的相似度行列"""
+        self.norms[row] = np.sqrt(max(self.norms[row] ** 2 - old ** 2 + new ** 2, 0.0))
+        return self._update_similarity(row)
+
+    def _cells_changed(self, rows, cols, old, new):
+        """整批更新：范数按平方差累加，受影响的用户一起重算相似度"""
+        sq = self.norms.astype(np.float64) ** 2
+        np.add.at(sq, rows, new.astype(np.float64) ** 2 - old.astype(np.float64) ** 2)
+        self.norms = np.sqrt(np.maximum(sq, 0.0)).astype(self.norms.dtype)
+        return self._update_similarity(np.unique(rows))
+
+    def _rescaled(self, factor):
+        self.norms *= factor
+
+    def _update_similarity(self, rows, block_size=256):
+        """只重算若干用户与所有用户的余弦相似度（按块计算），并写回相似度矩阵的行列或近邻索引
+
+        返回推荐结果可能变化的用户：这些用户本身及邻居列表发生变化的用户；稠密相似度矩阵返回 None
+        """
+        rows = np.atleast_1d(rows)
+        if isinstance(self.similarity, NeighborIndex):
+            return np.union1d(rows, self.similarity.update_rows(rows, self._similarities, block_size))
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            sims = self._similarities(block).toarray()
+            self.similarity[block, :] = sims
+            self.similarity[:, block] = sims.T
+        return None
+
+    def _similarities(self, rows):
+        """若干用户与所有用户的余弦相似度 CSR (len(rows) × U)
+
+        只沿这些用户看过的物品的用户列表累加，代价与这些物品的交互数有关，与矩阵非零元总数无关
+        """
+        dots = self.interactions.dot_t(self.interactions[rows]).tocsr()
+        return _cosine_rows(dots, self.norms[rows], self.norms)
+
+# ========== 新增：物品协同过滤 ==========
+
+class ItemCFModel(_InteractionModel):
+    """物品协同过滤：预计算物品-物品 Top-K 余弦邻居，按用户交互过的物品聚合邻居打分
+
+    单次推荐只涉及该用户交互过的物品及其 K 个邻居，耗时与用户数无关
+    """
+
+    def __init__(self, matrix, k=DEFAULT_NEIGHBORS, block_size=512, agg='max'):
+        super().__init__(matrix, agg)
+        self.norms = np.sqrt(np.asarray(self.matrix.multiply(self.matrix).sum(axis=0)).ravel())
+        self.item_neighbors = build_neighbor_index(self.matrix.T, k=k, block_size=block_size)
+
+    @property
+    def weights(self):
+        """物品近邻索引的 I×I 稀疏权重视图：第 j 行只有 j 的 K 个邻居
+
+        与近邻索引共享数组，近邻索引增量修补后无需重建
+        """
+        indices, scores = self.item_neighbors.indices, self.item_neighbors.scores
+        n_items, k = indices.shape
+        return sparse.csr_matrix(
+            (scores.reshape(-1), indices.reshape(-1), np.arange(0, n_items * k + 1, k, dtype=indices.dtype)),
+            shape=(n_items, n_items)
+        )
+
+    def recommend(self, user_id, news_df, top_k=5, top_n=10, candidates=None):
+        """与 recommend_for_user 返回格式一致；物品协同过滤没有相似用户，第一项为空列表
+
+        top_k 仅为接口兼容，物品邻居数在构建模型时由 k 决定
+        """
+        u_idx = self.user_index.index_of(user_id)
+        user_row = self.interactions[u_idx]
+        weights = self.weights
+        candidates = _as_candidates(candidates)
+        if candidates is None:
+            scores = (user_row @ weights).toarray()
+        else:
+            # 只取已看物品的邻居行，再截到候选列
+            neighbors = _restrict_columns(weights[user_row.indices], candidates)
+            scores = np.asarray(neighbors.T @ user_row.data, dtype=np.float64)[None, :]
+        top, _ = _rank_row(scores, user_row, top_n, candidates)
+        if len(top) == 0:
+            return [], []
+
+        # 推荐理由：对该物品得分贡献最大的已看物品
+        seen = user_row.indices
+        contrib = weights[seen][:, top].multiply(user_row.data[:, None]).toarray()
+        because = seen[np.argmax(contrib, axis=0)]
+        catalog = item_catalog(news_df, self.interactions)
+        return [], catalog.recommendations(top, [f"与你看过的《{title}》相似" for title in catalog.titles[because]])
+
+    def recommend_users(self, user_ids, news_df, top_k=5, top_n=10, candidates=None):
+        """批量推荐，返回格式与 recommend_for_users 一致"""
+        rows = self.user_index.index_of(np.asarray(user_ids))
+        candidates = _as_candidates(candidates)
+        weights = self.weights if candidates is None else _restrict_columns(self.weights, candidates)
+        return _rank_blocks(rows, lambda block: (self.interactions[block] @ weights).toarray(),
+                            self.interactions, item_catalog(news_df, self.interactions), top_n,
+                            candidates=candidates)
+
+    def _cell_changed(self, row, col, old, new):
+        """更新该物品的范数，重算该物品与所有物品的相似度并修补物品近邻索引"""
+        return self._cells_changed(np.array([row]), np.array([col]), np.array([old]), np.array([new]))
+
+    def _cells_changed(self, rows, cols, old, new, block_size=256):
+        """整批更新：范数按平方差累加，受影响的物品按块重算相似度并修补近邻索引（权重矩阵随之更新）
+
+        返回推荐结果可能变化的用户：这些用户本身，以及看过邻居列表发生变化的物品的用户
+        """
+        sq = self.norms.astype(np.float64) ** 2
+        np.add.at(sq, cols, np.asarray(new, dtype=np.float64) ** 2 - np.asarray(old, dtype=np.float64) ** 2)
+        self.norms = np.sqrt(np.maximum(sq, 0.0)).astype(self.norms.dtype)
+
+        changed_items = self.item_neighbors.update_rows(np.unique(cols), self._similarities, block_size)
+        return np.union1d(rows, self.interactions.columns(changed_items).indices)
+
+    def _similarities(self, items):
+        """若干物品与所有物品的余弦相似度 CSR (len(items) × I)，代价与看过这些物品的用户的交互数有关"""
+        dots = self.interactions.rdot(self.interactions.columns(items)).tocsr()
+        return _cosine_rows(dots, self.norms[items], self.norms)
+
+    def _rescaled(self, factor):
+        self.norms *= factor
+
+def _rank_row(scores, user_row, top_n, candidates=None):
+    """单个用户：屏蔽已看后取得分为正的 Top-N，返回 (列下标, 得分)
+
+    candidates 给定时 scores 只覆盖候选列，返回的列下标换回全体物品的列下标
+    """
+    top_n = min(top_n, scores.shape[1])
+    if top_n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=scores.dtype)
+    if candidates is not None:
+        user_row = _restrict_columns(user_row, candidates)
+    _mask_seen(scores, user_row)
+    top, top_scores = _top_n(scores, top_n)
+    positive = top_scores[0] > 0
+    top = top[0][positive]
+    return (top if candidates is None else candidates[top]), top_scores[0][positive]
+
+# ========== 新增：隐因子模型（ALS） ==========
+
+class ALSModel(_InteractionModel):
+    """隐式反馈交替最小二乘（Hu, Koren & Volinsky 2008）
+
+    用户、物品隐因子矩阵均为 float32，内存 O((U+I)·factors)；置信度 c = 1 + alpha·r
+    （点击 r=1，点赞 r=2），有交互的偏好为 1。每个半步用共轭梯度批量求解所有行，
+    单用户推荐只需一次矩阵-向量乘法加 Top-N 选择。
+    """
+
+    # 置信度依赖权重的绝对大小
+    scale_invariant = False
+
+    def __init__(self, matrix, factors=32, regularization=0.1, alpha=10.0, iterations=10,
+                 cg_steps=3, seed=42, agg='max'):
+        super().__init__(matrix, agg)
+        self.alpha = alpha
+        self.regularization = regularization
+        rng = np.random.default_rng(seed)
+        n_users, n_items = self.interactions.shape
+        self.user_factors = (rng.standard_normal((n_users, factors)) * 0.01).astype(np.float32)
+        self.item_factors = (rng.standard_normal((n_items, factors)) * 0.01).astype(np.float32)
+        self.fit(iterations, cg_steps)
+
+    @instrumented('ALSModel.fit')
+    def fit(self, iterations=10, cg_steps=3):
+        """交替更新用户与物品因子"""
+        user_items = self.matrix
+        item_users = self.matrix.T.tocsr()
+        for _ in range(iterations):
+            _als_solve(user_items, self.item_factors, self.user_factors, self.alpha, self.regularization, cg_steps)
+            _als_solve(item_users, self.user_factors, self.item_factors, self.alpha, self.regularization, cg_steps)
+        self._notify(None)
+        return self
+
+    def recommend(self, user_id, news_df, top_k=5, top_n=10, candidates=None):
+        """与 recommend_for_user 返回格式一致；没有相似用户，第一项为空列表，top_k 仅为接口兼容"""
+        u_idx = self.user_index.index_of(user_id)
+        candidates = _as_candidates(candidates)
+        item_factors = self.item_factors if candidates is None else self.item_factors[candidates]
+        scores = (item_factors @ self.user_factors[u_idx])[None, :]
+        top, top_scores = _rank_row(scores, self.interactions[u_idx], top_n, candidates)
+        catalog = item_catalog(news_df, self.interactions)
+        return [], catalog.recommendations(top, [f"兴趣向量匹配度 {sc:.2f}" for sc in top_scores])
+
+    def recommend_users(self, user_ids, news_df, top_k=5, top_n=10, candidates=None):
+        """批量推荐，返回格式与 recommend_for_users 一致"""
+        rows = self.user_index.index_of(np.asarray(user_ids))
+        candidates = _as_candidates(candidates)
+        item_factors = self.item_factors if candidates is None else self.item_factors[candidates]
+        return _rank_blocks(rows, lambda block: self.user_factors[block] @ item_factors.T,
+                            self.interactions, item_catalog(news_df, self.interactions), top_n,
+                            candidates=candidates)
+
+    def _cell_changed(self, row, col, old, new):
+        """固定物品因子，对该用户精确重解一次（fold-in），物品因子待下次 fit 更新"""
+        self._fold_in([row], self.item_factors.T @ self.item_factors)
+        return np.array([row])
+
+    def _cells_changed(self, rows, cols, old, new):
+        """批内每个受影响的用户各 fold-in 一次，YᵀY 只算一次；物品因子不变，只影响这些用户"""
+        rows = np.unique(rows)
+        self._fold_in(rows, self.item_factors.T @ self.item_factors)
+        return rows
+
+    def _fold_in(self, rows, YtY):
+        Y = self.item_factors
+        reg = self.regularization * np.eye(Y.shape[1], dtype=np.float32)
+        block = self.interactions[np.asarray(rows)]
+        for i, row in enumerate(rows):
+            start, end = block.indptr[i], block.indptr[i + 1]
+            items = block.indices[start:end]
+            weights = self.alpha * block.data[start:end]
+            Yu = Y[items]
+            A = YtY + (Yu.T * weights) @ Yu + reg
+            b = (1 + weights) @ Yu
+            self.user_factors[row] = np.linalg.solve(A, b)
+
+def _als_solve(interactions, fixed, target, alpha, regularization, cg_steps, max_nnz=1 << 20):
+    """固定一侧因子 fixed，用共轭梯度就地更新另一侧 target 的每一行
+
+    第 u 行求解 (YᵀY + Yᵀ(C_u − I)Y + λI) x_u = Yᵀ C_u p_u，以当前值热启动；
+    按非零元个数分块，单块的中间数组不超过 max_nnz × factors
+    """
+    YtY = fixed.T @ fixed + regularization * np.eye(fixed.shape[1], dtype=np.float32)
+    indptr = interactions.indptr
+    n_rows = interactions.shape[0]
+    start = 0
+    while start < n_rows:
+        # 找到累计非零元不超过 max_nnz 的行区间（至少一行）
+        stop = int(np.searchsorted(indptr, indptr[start] + max_nnz, side='right')) - 1
+        stop = min(max(stop, start + 1), n_rows)
+        block = interactions[start:stop]
+        weights = alpha * block.data
+        entry_rows = np.repeat(np.arange(stop - start), np.diff(block.indptr))
+        Yi = fixed[block.indices]
+
+        def apply_A(v):
+            coef = weights * np.einsum('ef,ef->e', Yi, v[entry_rows])
+            gathered = sparse.csr_matrix((coef, block.indices, block.indptr), shape=block.shape) @ fixed
+            return v @ YtY + gathered
+
+        b = sparse.csr_matrix((1 + weights, block.indices, block.indptr), shape=block.shape) @ fixed
+        x = target[start:stop]
+        r = b - apply_A(x)
+        p = r.copy()
+        rs_old = np.einsum('rf,rf->r', r, r)
+        for _ in range(cg_steps):
+            Ap = apply_A(p)
+            pAp = np.einsum('rf,rf->r', p, Ap)
+            step = np.divide(rs_old, pAp, out=np.zeros_like(rs_old), where=pAp > 0)
+            x += step[:, None] * p
+            r -= step[:, None] * Ap
+            rs_new = np.einsum('rf,rf->r', r, r)
+            beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 0)
+            p = r + beta[:, None] * p
+            rs_old = rs_new
+        start = stop
+
+# 可选的推荐算法
+ALGORITHMS = {
+    'user_cf': UserCFModel,
+    'item_cf': ItemCFModel,
+    'als': ALSModel,
+}
+
+ALGORITHM_NAMES = {
+    'user_cf': '用户协同过滤',
+    'item_cf': '物品协同过滤',
+    'als': '隐因子模型（ALS）',
+}
+
+def build_model(matrix, algorithm='user_cf', **params):
+    """按算法名构建推荐模型"""
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"未知的推荐算法: {algorithm}")
+    return ALGORITHMS[algorithm](matrix, **params)
+
+# ========== 新增：模型缓存 ==========
+
+@instrumented()
+def dataset_fingerprint(users_df, news_df, behaviors_df):
+    """对决定模型的列（用户/新闻 id 与行为三元组）做内容哈希"""
+    h = hashlib.sha1()
+    columns = (users_df['user_id'], news_df['news_id'],
+               behaviors_df['user_id'], behaviors_df['news_id'], behaviors_df['action'])
+    for col in columns:
+        h.update(str(len(col)).encode())
+        h.update(pd.util.hash_pandas_object(col, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+class ModelCache:
+    """按数据指纹缓存已构建的模型，按条数和内存上限做 LRU 淘汰；线程安全，可在会话间共享"""
+
+    def __init__(self, max_entries=4, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    @instrumented('ModelCache.get')
+    def get(self, users_df, news_df, behaviors_df, fingerprint=None, algorithm='user_cf', matrix=None,
+            similarity=None, **params):
+        """返回数据对应的模型，未命中时按 algorithm 与 params 构建；调用方如需修改模型请先 copy()
+
+        matrix 为已由这份数据构建好的用户-物品矩阵时（如分块加载的结果）直接使用，不再重建；
+        similarity 为已算好的用户相似度结构时（如场景快照）用于构建用户协同过滤模型，其他算法忽略
+        """
+        fingerprint = fingerprint or dataset_fingerprint(users_df, news_df, behaviors_df)
+        key = (fingerprint, algorithm, tuple(sorted(params.items())))
+        model = self._lookup(key)
+        if model is not None:
+            return model
+
+        # 同一时间只构建一个模型，等待期间其他线程可能已经建好
+        with self._build_lock:
+            model = self._lookup(key, count=False)
+            if model is None:
+                if matrix is None:
+                    matrix = build_user_item_matrix(users_df, news_df, behaviors_df)
+                if similarity is not None and algorithm == 'user_cf':
+                    params = {**params, 'similarity': similarity}
+                model = build_model(matrix, algorithm, **params)
+                self._store(key, model)
+        return model
+
+    def _lookup(self, key, count=True):
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+            if count:
+                if model is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            return model
+
+    def _store(self, key, model):
+        with self._lock:
+            self._models[key] = model
+            self._models.move_to_end(key)
+            # 至少保留刚放入的模型
+            while len(self._models) > 1 and (
+                len(self._models) > self.max_entries
+                or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+            ):
+                self._models.popitem(last=False)
+
+    @property
+    def nbytes(self):
+        return sum(model.nbytes for model in self._models.values())
+
+    def __len__(self):
+        return len(self._models)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+# ========== 新增：列式二进制存储 ==========
+
+# 二进制数据集目录：每列一个 .npy 文件，可内存映射加载
+DATA_DIR = 'data_bin'
+BINARY_FORMAT_VERSION = 1
+
+# 各表的列及编码方式：int 整数列，dict 字典编码，time 秒级时间戳，text UTF-8 文本，list 字典编码的列表列
+BINARY_SCHEMA = {
+    'users': {'user_id': 'int', 'age': 'int', 'gender': 'dict', 'interests': 'list'},
+    'news': {'news_id': 'int', 'title': 'text', 'category': 'dict', 'publish_time': 'time'},
+    'behaviors': {'user_id': 'int', 'news_id': 'int', 'action': 'dict', 'timestamp': 'time'},
+}
+
+# 与二进制数据集互为副本的 CSV 文件（save_dataset / load_dataset 读写的当前目录文件）
+CSV_FILES = ('data_users.csv', 'data_news.csv', 'data_behaviors.csv')
+
+@instrumented()
+def save_dataset_binary(users_df, news_df, behaviors_df, path=DATA_DIR, source=None):
+    """以列式二进制格式保存数据集：整数列压缩为最小整型，类别与兴趣字典编码，时间存为 int64 秒
+
+    每次保存写入新的版本子目录，写完后用 os.replace 原子替换 meta.json 指向它；
+    已被内存映射的旧文件不会被截断或改写，只在之后被删除（已有映射仍然有效），上一个版本保留给正在读取的进程。
+    source 为数据对应的 CSV 文件状态（csv_state() 的结果），记录在元数据中供 binary_is_current 判断
+    """
+    staging = _begin_binary_version(path)
+    tables = {}
+    for table, df in (('users', users_df), ('news', news_df), ('behaviors', behaviors_df)):
+        tables[table] = _save_table(df, table, staging)
+    _commit_binary_version(path, staging, tables, source)
+
+def csv_state():
+    """当前目录下 CSV 数据文件的 {文件名: [大小, 修改时间(纳秒)]}；任一文件不存在时返回 None"""
+    state = {}
+    for name in CSV_FILES:
+        try:
+            st = os.stat(name)
+        except FileNotFoundError:
+            return None
+        state[name] = [st.st_size, st.st_mtime_ns]
+    return state
+
+def binary_is_current(path=DATA_DIR):
+    """二进制数据集是否可以代替 CSV 使用：没有 CSV 文件，或 CSV 自写入二进制数据集以来没有变化
+
+    二进制数据集不存在时返回 False
+    """
+    meta = _read_json(os.path.join(path, 'meta.json'))
+    if meta is None:
+        return False
+    state = csv_state()
+    return state is None or meta.get('source') == state
+
+def _save_table(df, table, directory):
+    columns = {}
+    for col, kind in BINARY_SCHEMA[table].items():
+        columns[col] = _save_column(df[col], kind, os.path.join(directory, f"{table}.{col}"))
+    return {'rows': len(df), 'columns': columns}
+
+def _begin_binary_version(path):
+    """新建一个临时目录用于写入新版本（以 . 开头，不会被其他保存过程清理）"""
+    os.makedirs(path, exist_ok=True)
+    staging = os.path.join(path, f".tmp-{time.time_ns()}-{os.getpid()}-{threading.get_ident()}")
+    os.makedirs(staging)
+    return staging
+
+def _commit_binary_version(path, staging, tables, source=None):
+    """临时目录改名为版本子目录，原子替换 meta.json 指向它，再删除更早的版本"""
+    previous = _read_json(os.path.join(path, 'meta.json'))
+    version_dir = 'v' + os.path.basename(staging)[len('.tmp-'):]
+    os.rename(staging, os.path.join(path, version_dir))
+    # 元数据最后原子替换，作为保存完成的标志
+    _write_json(os.path.join(path, 'meta.json'),
+                {'version': BINARY_FORMAT_VERSION, 'dir': version_dir, 'tables': tables, 'source': source})
+
+    keep = {version_dir, None if previous is None else previous.get('dir')}
+    for name in os.listdir(path):
+        full = os.path.join(path, name)
+        if name.startswith('v') and os.path.isdir(full) and name not in keep:
+            shutil.rmtree(full, ignore_errors=True)
+        elif name.endswith('.npy') and previous is not None and 'dir' in previous:
+            # 旧布局直接放在目录下的列文件
+            os.remove(full)
+
+@instrumented()
+def load_dataset_binary(path=DATA_DIR, mmap=True):
+    """加载列式二进制数据集；mmap=True 时数值列直接内存映射，行为表不会逐行生成 Python 对象
+
+    目录不存在时返回 (None, None, None)
+    """
+    try:
+        with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None, None, None
+    if meta['version'] != BINARY_FORMAT_VERSION:
+        raise ValueError(f"不支持的数据格式版本: {meta['version']}")
+
+    # 旧布局的列文件直接放在目录下，没有版本子目录
+    base = os.path.join(path, meta.get('dir', ''))
+    mmap_mode = 'r' if mmap else None
+    frames = []
+    for table in ('users', 'news', 'behaviors'):
+        columns = meta['tables'][table]['columns']
+        data = {
+            col: _load_column(info, os.path.join(base, f"{table}.{col}"), mmap_mode)
+            for col, info in columns.items()
+        }
+        frames.append(pd.DataFrame(data, copy=False))
+    return tuple(frames)
+
+def _save_column(series, kind, prefix):
+    """按编码方式写出一列，返回该列的元数据"""
+    if kind == 'int':
+        values = series.to_numpy(dtype=np.int64)
+        np.save(prefix + '.npy', values.astype(_int_dtype(values)))
+        return {'kind': kind}
+    if kind == 'dict':
+        codes, vocab = _dict_encode(series)
+        np.save(prefix + '.npy', codes)
+        return {'kind': kind, 'vocab': vocab}
+    if kind == 'time':
+        np.save(prefix + '.npy', _to_epoch(series))
+        return {'kind': kind}
+    if kind == 'text':
+        encoded = [str(v).encode('utf-8') for v in series]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        np.save(prefix + '.npy', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        np.save(prefix + '.offsets.npy', offsets)
+        return {'kind': kind}
+    if kind == 'list':
+        lengths = series.map(len).to_numpy(dtype=np.int64)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        codes, vocab = _dict_encode(series.explode().dropna())
+        np.save(prefix + '.npy', codes)
+        np.save(prefix + '.offsets.npy', offsets)
+        return {'kind': kind, 'vocab': vocab}
+    raise ValueError(f"未知的列编码: {kind}")
+
+def _load_column(info, prefix, mmap_mode):
+    kind = info['kind']
+    values = np.load(prefix + '.npy', mmap_mode=mmap_mode)
+    if kind == 'int':
+        return values
+    if kind == 'dict':
+        return pd.Categorical.from_codes(values, info['vocab'], validate=False)
+    if kind == 'time':
+        return values.view('datetime64[s]')
+    # 变长列按偏移量切分，先转成 Python 列表再切片，避免逐行切片内存映射数组
+    offsets = np.load(prefix + '.offsets.npy').tolist()
+    if kind == 'text':
+        blob = bytes(values)
+        return [blob[a:b].decode('utf-8') for a, b in zip(offsets[:-1], offsets[1:])]
+    if kind == 'list':
+        flat = np.array(info['vocab'], dtype=object)[np.asarray(values)].tolist()
+        return [flat[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+    raise ValueError(f"未知的列编码: {kind}")
+
+def _int_dtype(values):
+    """能容纳全部取值的最小整型（int32 或 int64）"""
+    info = np.iinfo(np.int32)
+    if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+        return np.int32
+    return np.int64
+
+def _dict_encode(series):
+    """字典编码：返回 (编码数组, 词表)，编码用能容纳词表的最小整型"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        vocab = list(series.cat.categories)
+    else:
+        codes, uniques = pd.factorize(series)
+        vocab = list(uniques)
+    dtype = np.int8 if len(vocab) < 128 else np.int16 if len(vocab) < 32768 else np.int32
+    return codes.astype(dtype), [str(v) for v in vocab]
+
+def _to_epoch(series):
+    """时间列（字符串、category 或 datetime）转为 int64 秒级时间戳；category 只解析各类别一次"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        epochs = _to_epoch(pd.Series(series.cat.categories))
+        return epochs[series.cat.codes.to_numpy()]
+    values = pd.to_datetime(series)
+    return values.to_numpy(dtype='datetime64[s]').view(np.int64)
+
+# ========== 新增：离线评估 ==========
+
+@instrumented()
+def leave_one_out_split(behaviors_df):
+    """留一法切分：每个用户按 timestamp 留出最近一次交互的新闻作为测试样本
+
+    训练集去掉该 (用户, 新闻) 的全部行为，避免泄漏；只交互过一条新闻的用户不参与评估。
+    返回 (训练行为 DataFrame, 测试 DataFrame[user_id, news_id])
+    """
+    if len(behaviors_df) == 0:
+        return behaviors_df.reset_index(drop=True), pd.DataFrame({
+            'user_id': behaviors_df['user_id'].to_numpy(), 'news_id': behaviors_df['news_id'].to_numpy()
+        })
+    # ID 可能稀疏，先编码为连续整数再组合成 (用户, 新闻) 键
+    users, _ = pd.factorize(behaviors_df['user_id'])
+    news, news_uniques = pd.factorize(behaviors_df['news_id'])
+    users = users.astype(np.int64)
+    keys = users * len(news_uniques) + news
+
+    # 按 (用户, 时间) 排序，每个用户的最后一条即最近一次交互
+    order = np.lexsort((_to_epoch(behaviors_df['timestamp']), users))
+    sorted_users = users[order]
+    last = order[np.r_[sorted_users[1:] != sorted_users[:-1], True]]
+
+    # 至少交互过两条不同新闻的用户才留出
+    distinct_users = np.unique(keys) // max(len(news_uniques), 1)
+    eligible = np.isin(users[last], distinct_users[np.r_[distinct_users[1:] == distinct_users[:-1], False]])
+    last = last[eligible]
+
+    train = behaviors_df[~np.isin(keys, keys[last])].reset_index(drop=True)
+    test = pd.DataFrame({'user_id': behaviors_df['user_id'].to_numpy()[last],
+                         'news_id': behaviors_df['news_id'].to_numpy()[last]})
+    return train, test
+
+@instrumented()
+def evaluate_offline(users_df, news_df, behaviors_df, algorithms=('user_cf',), top_k=(5,), top_n=(10,),
+                     n_workers=1):
+    """留一法离线评估：对每个算法变体 × top_k × top_n 计算命中率、NDCG、覆盖率与类别多样性
+
+    algorithms 中每一项可以是算法名，也可以是 (算法名, 构建参数字典)，用于比较超参数。
+    每个变体只训练一次；同一 top_k 下只按最大的 top_n 批量推荐一次，较小的 top_n 取前缀。
+    n_workers>1 时各变体在进程池中并行训练与评估。返回每个组合一行的 DataFrame。
+    """
+    train, test = leave_one_out_split(behaviors_df)
+    matrix = build_user_item_matrix(users_df, news_df, train)
+    variants = [(a, {}) if isinstance(a, str) else (a[0], dict(a[1])) for a in algorithms]
+    grid = [(int(k), sorted(int(n) for n in top_n)) for k in top_k]
+    args = (matrix, news_df, test['user_id'].to_numpy(), test['news_id'].to_numpy(), grid)
+
+    if n_workers > 1 and len(variants) > 1:
+        with ProcessPoolExecutor(min(n_workers, len(variants))) as pool:
+            futures = [pool.submit(_evaluate_variant, algorithm, params, *args) for algorithm, params in variants]
+            rows = [row for f in futures for row in f.result()]
+    else:
+        rows = [row for algorithm, params in variants for row in _evaluate_variant(algorithm, params, *args)]
+    return pd.DataFrame(rows)
+
+def _evaluate_variant(algorithm, params, matrix, news_df, test_users, test_news, grid):
+    """训练一个算法变体并在 top_k × top_n 网格上评估，返回结果记录列表
+
+    用户协同过滤的近邻索引只保存 k 个邻居，网格中更大的 top_k 会被截断，因此按最大的 top_k 构建
+    """
+    build_params = dict(params)
+    if algorithm == 'user_cf':
+        build_params['k'] = max(build_params.get('k', DEFAULT_NEIGHBORS), max(k for k, _ in grid))
+    start = time.perf_counter()
+    model = build_model(matrix, algorithm, **build_params)
+    train_seconds = time.perf_counter() - start
+
+    rows = []
+    for k, ns in grid:
+        start = time.perf_counter()
+        ids, _ = model.recommend_users(test_users, news_df, top_k=k, top_n=ns[-1])
+        recommend_seconds = time.perf_counter() - start
+        for n in ns:
+            rows.append({
+                '算法': algorithm,
+                '参数': ', '.join(f"{key}={value}" for key, value in params.items()),
+                'top_k': k,
+                'top_n': n,
+                **ranking_metrics(ids[:, :n], test_news, news_df),
+                '用户数': len(test_users),
+                '训练(s)': train_seconds,
+                '推荐(s)': recommend_seconds,
+            })
+    return rows
+
+def ranking_metrics(rec_ids, target_ids, news_df):
+    """一批推荐列表的评估指标（全部为数组运算）
+
+    rec_ids: (用户数, N) 推荐的 news_id，-1 表示空位；target_ids: 每个用户留出的 news_id。
+    命中率 HR@N、NDCG@N（单个相关物品，命中第 r 位得 1/log2(r+1)）、
+    覆盖率（被推荐过的新闻占全部新闻的比例）、类别多样性（每个列表平均覆盖的类别数）
+    """
+    n_users = len(rec_ids)
+    hits = rec_ids == np.asarray(target_ids)[:, None]
+    hit = hits.any(axis=1)
+    ranks = hits.argmax(axis=1)
+    ndcg = np.where(hit, 1.0 / np.log2(ranks + 2), 0.0)
+
+    valid = rec_ids >= 0
+    recommended = np.unique(rec_ids[valid])
+
+    catalog = item_catalog(news_df)
+    cats = catalog.category_codes[catalog.index.get_indexer(rec_ids[valid])]
+    user_idx = np.nonzero(valid)[0]
+    # 类别缺失的新闻（编码 -1）不计入多样性
+    known = cats >= 0
+    present = np.zeros((n_users, len(catalog.category_names)), dtype=bool)
+    present[user_idx[known], cats[known]] = True
+
+    return {
+        '命中率': float(hit.mean()) if n_users else 0.0,
+        'NDCG': float(ndcg.mean()) if n_users else 0.0,
+        '覆盖率': len(recommended) / len(news_df),
+        '类别多样性': float(present.sum(axis=1).mean()) if n_users else 0.0,
+    }
+
+# ========== 新增：行为流式接入 ==========
+
+# 行为日志中 action 的编码顺序
+ACTION_CODES = list(ACTION_WEIGHTS)
+
+class EventLog:
+    """只追加的行为日志：每列一个可增长的 numpy 缓冲区，容量不足时翻倍，追加均摊 O(批大小)"""
+
+    def __init__(self, capacity=1024):
+        capacity = max(int(capacity), 1)
+        self._columns = {
+            'user_id': np.empty(capacity, dtype=np.int64),
+            'news_id': np.empty(capacity, dtype=np.int64),
+            'action': np.empty(capacity, dtype=np.int8),
+            'timestamp': np.empty(capacity, dtype=np.int64),
+        }
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(self._columns['user_id'])
+
+    def append(self, user_ids, news_ids, action_codes, timestamps):
+        """追加一批事件（四列等长数组，action 为 ACTION_CODES 中的编码，timestamp 为秒级时间戳）"""
+        n = len(user_ids)
+        if self._size + n > self.capacity:
+            capacity = max(self.capacity * 2, self._size + n)
+            for name, col in self._columns.items():
+                grown = np.empty(capacity, dtype=col.dtype)
+                grown[:self._size] = col[:self._size]
+                self._columns[name] = grown
+        end = self._size + n
+        self._columns['user_id'][self._size:end] = user_ids
+        self._columns['news_id'][self._size:end] = news_ids
+        self._columns['action'][self._size:end] = action_codes
+        self._columns['timestamp'][self._size:end] = timestamps
+        self._size = end
+
+    def column(self, name):
+        """某一列已写入部分的视图（不复制）"""
+        return self._columns[name][:self._size]
+
+    def to_frame(self):
+        """导出为与 behaviors_df 相同列的 DataFrame"""
+        return pd.DataFrame({
+            'user_id': self.column('user_id').copy(),
+            'news_id': self.column('news_id').copy(),
+            'action': pd.Categorical.from_codes(self.column('action'), categories=ACTION_CODES),
+            'timestamp': self.column('timestamp').astype('datetime64[s]'),
+        })
+
+class BehaviorStream:
+    """流式行为接入：事件批次追加到 EventLog，并原地更新模型的矩阵与相似度/近邻结构
+
+    half_life（秒）不为 None 时按时间指数衰减。为了不在每批都改写全部历史，
+    新事件的权重按 2^((t - anchor)/half_life) 放大（相当于旧事件相对衰减）；
+    协同过滤的余弦相似度与排序对整体缩放不敏感，只有放大倍数超过 2^rescale_half_lives 时
+    才把整个矩阵缩放一次并把基准时间移到最新事件。ALS 的置信度 1 + alpha·r 依赖权重的绝对大小，
+    不满足这一前提，不支持 half_life。
+    """
+
+    def __init__(self, model, half_life=None, anchor=None, log=None, rescale_half_lives=20):
+        if half_life is not None and not model.scale_invariant:
+            raise ValueError(f"{type(model).__name__} 的结果随权重整体缩放而变化，不支持时间衰减（half_life）")
+        self.model = model
+        self.half_life = half_life
+        self.anchor = anchor
+        self.log = log if log is not None else EventLog()
+        self.rescale_half_lives = rescale_half_lives
+
+    @classmethod
+    def from_frames(cls, users_df, news_df, behaviors_df, algorithm='user_cf', half_life=None,
+                    rescale_half_lives=20, **params):
+        """用已有数据初始化：构建（带衰减的）矩阵与模型，历史行为写入日志"""
+        epochs = _to_epoch(behaviors_df['timestamp'])
+        anchor = int(epochs.max()) if len(epochs) else None
+        if half_life is not None and not ALGORITHMS[algorithm].scale_invariant:
+            raise ValueError(f"{ALGORITHM_NAMES[algorithm]}不支持时间衰减（half_life）")
+        matrix = build_user_item_matrix(users_df, news_df, behaviors_df, agg=params.get('agg', 'max'),
+                                        half_life=half_life, now=anchor)
+        stream = cls(build_model(matrix, algorithm, **params), half_life=half_life, anchor=anchor,
+                     log=EventLog(capacity=len(behaviors_df) * 2), rescale_half_lives=rescale_half_lives)
+        stream.log.append(behaviors_df['user_id'].to_numpy(), behaviors_df['news_id'].to_numpy(),
+                          _action_codes(behaviors_df['action']), epochs)
+        return stream
+
+    @instrumented('BehaviorStream.ingest')
+    def ingest(self, events):
+        """接入一批事件（DataFrame，列 user_id、news_id、action，可选 timestamp，缺省为当前时间）
+
+        返回取值发生变化的矩阵单元格数
+        """
+        n = len(events)
+        if n == 0:
+            return 0
+        if 'timestamp' in events:
+            epochs = _to_epoch(events['timestamp'])
+        else:
+            epochs = np.full(n, int(time.time()), dtype=np.int64)
+        user_ids = events['user_id'].to_numpy()
+        news_ids = events['news_id'].to_numpy()
+        weights = _action_weights(events['action'])
+
+        if self.half_life is not None:
+            latest = int(epochs.max())
+            if self.anchor is None:
+                self.anchor = latest
+            elif latest - self.anchor > self.rescale_half_lives * self.half_life:
+                self.model.rescale(_decay_factor(self.anchor, latest, self.half_life))
+                self.anchor = latest
+            weights = weights * _decay_factor(epochs, self.anchor, self.half_life)
+
+        changed = self.model.add_behaviors(user_ids, news_ids, weights=weights)
+        self.log.append(user_ids, news_ids, _action_codes(events['action']), epochs)
+        return changed
+
+    def behaviors(self):
+        """日志中的全部行为（DataFrame）"""
+        return self.log.to_frame()
+
+def _action_codes(actions):
+    """行为类型转 ACTION_CODES 编码（int8）"""
+    return pd.Categorical(actions, categories=ACTION_CODES).codes.astype(np.int8)
+
+# ========== 新增：分块流式加载 ==========
+
+# 分块读取行为 CSV 的默认行数
+CSV_CHUNK_SIZE = 1_000_000
+
+# 行为 CSV 的列类型：ID 直接解析为整数，action 与 timestamp 解析为分类（重复值只存一份）
+BEHAVIOR_CSV_DTYPES = {'user_id': 'int64', 'news_id': 'int64', 'action': 'category', 'timestamp': 'category'}
+
+def iter_behavior_chunks(path='data_behaviors.csv', chunk_size=CSV_CHUNK_SIZE, with_timestamp=True, progress=None):
+    """分块读取行为 CSV，每块为紧凑类型：user_id/news_id 为 int64、action 为分类、timestamp 为 int64 秒
+
+    with_timestamp=False 时不读取时间列；progress(已读行数, 已读字节, 文件字节) 每读完一块回调一次
+    """
+    usecols = ['user_id', 'news_id', 'action'] + (['timestamp'] if with_timestamp else [])
+    dtypes = {col: BEHAVIOR_CSV_DTYPES[col] for col in usecols}
+    total = os.path.getsize(path)
+    rows = 0
+    with open(path, 'rb') as f:
+        for chunk in pd.read_csv(f, usecols=usecols, dtype=dtypes, chunksize=chunk_size):
+            if with_timestamp:
+                chunk['timestamp'] = _to_epoch(chunk['timestamp'])
+            rows += len(chunk)
+            if progress is not None:
+                progress(rows, f.tell(), total)
+            yield chunk
+
+@instrumented()
+def load_interaction_matrix(users_df, news_df, path='data_behaviors.csv', chunk_size=CSV_CHUNK_SIZE, agg='max',
+                            half_life=None, on_chunk=None, progress=None):
+    """分块流式读取行为 CSV，每块映射为下标后直接并入用户-物品矩阵，不保留原始 DataFrame
+
+    峰值内存约为一块的紧凑列加上矩阵本身，与文件大小无关。结果与 build_user_item_matrix 一致
+    （half_life 衰减以全部行为中最新的时间为基准，基准后移时把已累加的部分整体缩放）。
+    on_chunk(chunk) 在每块并入矩阵后调用（块内 timestamp 为 int64 秒），可用于把行为逐块写入磁盘
+    """
+    user_index = IdIndex(users_df['user_id'].to_numpy())
+    catalog = item_catalog(news_df)
+    item_index = catalog.index
+    shape = (len(user_index), len(item_index))
+    matrix = sparse.csr_matrix(shape, dtype=np.float32)
+    anchor = None
+
+    with_timestamp = half_life is not None or on_chunk is not None
+    for chunk in iter_behavior_chunks(path, chunk_size, with_timestamp=with_timestamp, progress=progress):
+        if len(chunk) == 0:
+            continue
+        rows = user_index.index_of(chunk['user_id'].to_numpy())
+        cols = item_index.index_of(chunk['news_id'].to_numpy())
+        values = _action_weights(chunk['action'])
+        if half_life is not None:
+            latest = int(chunk['timestamp'].max())
+            if anchor is None or latest > anchor:
+                if anchor is not None:
+                    matrix.data *= _decay_factor(anchor, latest, half_life)
+                anchor = latest
+            values = values * _decay_factor(chunk['timestamp'].to_numpy(), anchor, half_life)
+
+        block = _to_csr(rows, cols, values, shape, agg)
+        matrix = (matrix + block) if agg == 'sum' else matrix.maximum(block)
+        if on_chunk is not None:
+            on_chunk(chunk)
+        # 读下一块之前释放本块
+        del chunk, rows, cols, values, block
+
+    return _attach_index(sparse.csr_matrix(matrix, dtype=np.float32), user_index, item_index, catalog)
+
+@instrumented()
+def load_dataset_chunked(chunk_size=CSV_CHUNK_SIZE, progress=None, path=DATA_DIR):
+    """读取 CSV 数据集：行为分块流式读取，同时构建用户-物品矩阵并逐块写入 path 下的列式二进制数据集
+
+    内存中不拼接整张行为表：返回的三张表从刚写好的二进制数据集内存映射加载，峰值内存约为一块行为加上矩阵，
+    之后 CSV 不变时再导入可直接走 load_dataset_binary（见 binary_is_current）。
+    返回 (users_df, news_df, behaviors_df, matrix)，文件不存在时全部为 None
+    """
+    # 读取前记下 CSV 状态：读取期间文件被替换时，下次导入会重新读取
+    source = csv_state()
+    try:
+        users_df = pd.read_csv('data_users.csv')
+        news_df = pd.read_csv('data_news.csv')
+    except FileNotFoundError:
+        return None, None, None, None
+    users_df['interests'] = users_df['interests'].apply(ast.literal_eval)
+
+    writer = _BehaviorWriter(path)
+    try:
+        matrix = load_interaction_matrix(users_df, news_df, chunk_size=chunk_size, on_chunk=writer.append,
+                                         progress=progress)
+    except FileNotFoundError:
+        writer.abort()
+        return None, None, None, None
+    except BaseException:
+        writer.abort()
+        raise
+    writer.finish(users_df, news_df, source)
+    users_df, news_df, behaviors_df = load_dataset_binary(path)
+    return users_df, news_df, behaviors_df, matrix
+
+class _BehaviorWriter:
+    """把行为逐块追加到列式二进制数据集的新版本：各列先写原始文件，finish 时转为 .npy、补上用户与新闻表后提交"""
+
+    COLUMNS = {'user_id': np.int64, 'news_id': np.int64, 'action': np.int8, 'timestamp': np.int64}
+
+    def __init__(self, path):
+        self.path = path
+        self.staging = _begin_binary_version(path)
+        self.rows = 0
+        self._bounds = {'user_id': [0, 0], 'news_id': [0, 0]}
+        self._files = {col: open(self._raw(col), 'wb') for col in self.COLUMNS}
+
+    def _raw(self, col):
+        return os.path.join(self.staging, f"behaviors.{col}.raw")
+
+    def append(self, chunk):
+        values = {
+            'user_id': chunk['user_id'].to_numpy(dtype=np.int64),
+            'news_id': chunk['news_id'].to_numpy(dtype=np.int64),
+            'action': _action_codes(chunk['action']),
+            'timestamp': chunk['timestamp'].to_numpy(dtype=np.int64),
+        }
+        if len(chunk):
+            for col, bounds in self._bounds.items():
+                lo, hi = int(values[col].min()), int(values[col].max())
+                bounds[:] = [lo, hi] if self.rows == 0 else [min(bounds[0], lo), max(bounds[1], hi)]
+        for col, f in self._files.items():
+            f.write(values[col].astype(self.COLUMNS[col], copy=False).tobytes())
+        self.rows += len(chunk)
+
+    def finish(self, users_df, news_df, source=None, block_rows=CSV_CHUNK_SIZE):
+        for f in self._files.values():
+            f.close()
+        columns = {}
+        for col, dtype in self.COLUMNS.items():
+            target = _int_dtype(np.array(self._bounds[col])) if col in self._bounds else dtype
+            out = np.lib.format.open_memmap(os.path.join(self.staging, f"behaviors.{col}.npy"), mode='w+',
+                                            dtype=target, shape=(self.rows,))
+            if self.rows:
+                raw = np.memmap(self._raw(col), dtype=dtype, mode='r')
+                for start in range(0, self.rows, block_rows):
+                    out[start:start + block_rows] = raw[start:start + block_rows]
+                del raw
+            out.flush()
+            del out
+            os.remove(self._raw(col))
+            columns[col] = {'kind': 'dict', 'vocab': ACTION_CODES} if col == 'action' else \
+                {'kind': 'time' if col == 'timestamp' else 'int'}
+        tables = {
+            'users': _save_table(users_df, 'users', self.staging),
+            'news': _save_table(news_df, 'news', self.staging),
+            'behaviors': {'rows': self.rows, 'columns': columns},
+        }
+        _commit_binary_version(self.path, self.staging, tables, source)
+
+    def abort(self):
+        for f in self._files.values():
+            f.close()
+        shutil.rmtree(self.staging, ignore_errors=True)
+
+# ========== 新增：候选集预筛选 ==========
+
+class CandidateIndex:
+    """候选集生成：全体物品按 publish_time 排序的索引 + 类别倒排索引（每个类别内同样按时间排序）
+
+    取时间窗口只需两次二分查找，代价与窗口内（或 limit 限定）的物品数有关，与目录总量无关。
+    返回的候选集是列下标（与 news_df 行顺序、用户-物品矩阵列顺序一致），可直接传给各推荐函数的 candidates
+    """
+
+    def __init__(self, news_df):
+        times = _to_epoch(news_df['publish_time'])
+        self.by_time = np.argsort(times, kind='stable')
+        self.times = times[self.by_time]
+        catalog = item_catalog(news_df)
+        codes = catalog.category_codes[self.by_time]
+        self.by_category = {}
+        for code, cat in enumerate(catalog.category_names):
+            in_cat = codes == code
+            self.by_category[cat] = (self.by_time[in_cat], self.times[in_cat])
+
+    def __len__(self):
+        return len(self.by_time)
+
+    @property
+    def latest(self):
+        """最新一条新闻的发布时间（秒级时间戳），作为默认的“当前时间”"""
+        return int(self.times[-1]) if len(self.times) else 0
+
+    def recent(self, window=None, now=None, limit=None):
+        """发布时间在 [now - window, now] 内的物品（按时间升序）；limit 给定时只取最新的 limit 个"""
+        now = self.latest if now is None else now
+        return _time_slice(self.by_time, self.times, window, now, limit)
+
+    def candidates(self, interests=None, window=None, now=None, explore=0, limit=None, seed=None):
+        """生成候选集（升序的列下标）
+
+        window 为时间窗口（秒），None 表示不限；interests 为 None 时取窗口内全部物品，
+        给定类别列表时只取这些类别，另从窗口内其他类别随机抽 explore 个作为探索；
+        limit 限制每个类别（或整个窗口）最多取最新的多少个
+        """
+        now = self.latest if now is None else now
+        if interests is None:
+            return np.sort(self.recent(window, now, limit))
+
+        interests = [cat for cat in interests if cat in self.by_category]
+        parts = [_time_slice(*self.by_category[cat], window, now, limit) for cat in interests]
+        if explore:
+            others = [_time_slice(*self.by_category[cat], window, now, limit)
+                      for cat in self.by_category if cat not in interests]
+            pool = np.concatenate(others) if others else np.empty(0, dtype=np.int64)
+            if len(pool):
+                rng = np.random.default_rng(seed)
+                parts.append(rng.choice(pool, size=min(explore, len(pool)), replace=False))
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+def user_interests(users_df, user_ids):
+    """按用户 ID 查兴趣类别列表（走 ID 索引）；user_ids 为标量时返回单个列表，否则返回列表数组"""
+    index = IdIndex(users_df['user_id'].to_numpy())
+    return users_df['interests'].to_numpy()[index.index_of(user_ids)]
+
+def group_by_interests(interests):
+    """把一批用户按兴趣类别组合分组，返回 {兴趣元组: 该组在输入中的位置数组}，同组共用一个候选集"""
+    groups = {}
+    for i, cats in enumerate(interests):
+        groups.setdefault(tuple(sorted(cats)), []).append(i)
+    return {key: np.array(pos) for key, pos in groups.items()}
+
+def _time_slice(cols, times, window, now, limit):
+    """在按时间升序的 (cols, times) 上二分截取 [now - window, now]，limit 给定时只保留最新的 limit 个"""
+    hi = int(np.searchsorted(times, now, side='right'))
+    lo = 0 if window is None else int(np.searchsorted(times, now - window, side='left'))
+    if limit is not None:
+        lo = max(lo, hi - limit)
+    return cols[lo:hi]
+
+def _as_candidates(candidates):
+    """候选集规整为升序、去重的 int64 列下标；None 表示全部物品"""
+    if candidates is None:
+        return None
+    candidates = np.asarray(candidates, dtype=np.int64)
+    # CandidateIndex 的结果已经有序，只需 O(C) 检查
+    if len(candidates) < 2 or bool((candidates[1:] > candidates[:-1]).all()):
+        return candidates
+    return np.unique(candidates)
+
+def _restrict_columns(matrix, candidates):
+    """CSR 矩阵只保留候选列，列号换成在候选集中的位置（candidates 须升序）
+
+    按非零元二分查找，代价 O(nnz·log C)，不会按物品总数分配数组
+    """
+    pos = np.searchsorted(candidates, matrix.indices)
+    hit = pos < len(candidates)
+    hit[hit] = candidates[pos[hit]] == matrix.indices[hit]
+    indptr = np.concatenate([[0], np.cumsum(hit)])[matrix.indptr]
+    return sparse.csr_matrix((matrix.data[hit], pos[hit], indptr), shape=(matrix.shape[0], len(candidates)))
+
+# ========== 新增：推荐结果缓存 ==========
+
+class RecommendationCache:
+    """单用户推荐结果缓存：键为 (模型版本, 用户, 参数)，按条数与内存上限做 LRU 淘汰，可设 TTL；线程安全
+
+    首次缓存某个模型的结果时注册为它的行为更新回调：新行为写入后只失效推荐结果可能变化的用户
+    （该用户本身、近邻列表含有该用户的用户等，由模型给出），其余条目继续命中；
+    模型重训或整体缩放后版本号改变，旧版本的条目不再命中，随 LRU 淘汰
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=64 << 20, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()  # key -> (结果, 过期时间, 估算字节数)
+        self._by_user = {}             # (模型版本, 用户 ID) -> 该用户的所有键
+        self._watched = weakref.WeakSet()  # 已注册回调的模型
+        self._epoch = 0                # 每次失效加一，计算期间发生失效的结果不写入
+        self._lock = threading.Lock()
+
+    def get(self, model, user_id, news_df, top_k=5, top_n=10, candidates=None, candidates_key=None):
+        """返回 model.recommend 的结果，未命中时计算并缓存
+
+        candidates 给定时以 candidates_key 区分候选集（未给出时对候选下标取哈希）
+        """
+        if candidates is not None and candidates_key is None:
+            candidates_key = hashlib.blake2b(np.asarray(candidates).tobytes(), digest_size=16).hexdigest()
+        key = self.key(model, user_id, top_k, top_n, candidates_key)
+        epoch = self.epoch
+        value = self.lookup(key)
+        if value is None:
+            value = model.recommend(user_id, news_df, top_k=top_k, top_n=top_n, candidates=candidates)
+            self.store(model, key, value, epoch)
+        return value
+
+    @staticmethod
+    def key(model, user_id, *params):
+        return (model.version, user_id, params)
+
+    def lookup(self, key):
+        """命中时返回缓存的结果，否则返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def store(self, model, key, value, epoch=None):
+        """写入一条结果；epoch 为计算前读取的 self._epoch，期间发生过失效时丢弃该结果"""
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            if model not in self._watched:
+                self._watched.add(model)
+                model.add_listener(self._invalidate)
+            if (epoch is not None and epoch != self._epoch) or key[0] != model.version:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires, size)
+            self._by_user.setdefault(key[:2], set()).add(key)
+            self.nbytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _invalidate(self, model, rows):
+        """模型的行为更新回调：rows 为推荐结果可能变化的用户行号，None 时模型已换版本"""
+        with self._lock:
+            self._epoch += 1
+            if rows is None:
+                return
+            for user_id in model.user_index.id_of(rows).tolist():
+                for key in list(self._by_user.get((model.version, user_id), ())):
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self.nbytes -= size
+        keys = self._by_user[key[:2]]
+        keys.discard(key)
+        if not keys:
+            del self._by_user[key[:2]]
+
+    @property
+    def epoch(self):
+        """失效计数，store 时用于丢弃计算期间已失效的结果"""
+        return self._epoch
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'nbytes': self.nbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hit_rate, 4),
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+            self.nbytes = 0
+
+# ========== 新增：分块精确相似度（落盘） ==========
+
+SIMILARITY_DIR = 'similarity_bin'
+SIMILARITY_TILE = 4096
+
+@instrumented()
+def blocked_similarity(matrix, path=SIMILARITY_DIR, tile=SIMILARITY_TILE, n_workers=None, checkpoint=16,
+                       progress=None):
+    """精确的 U×U 用户余弦相似度，按 tile×tile 分块计算并写入磁盘上的 float32 .npy，返回只读内存映射
+
+    行先归一化为 float32，每块是一次稀疏乘法，只算上三角的块并同时写入对称位置；
+    各块由线程池并行计算，内存占用约为 n_workers 个块。每完成 checkpoint 个块把内存映射刷盘并记入
+    manifest.json，中断后以相同参数再次调用时跳过已记录的块继续计算。返回值可直接当作稠密相似度使用，
+    按行读取时才从磁盘换入。progress(done, total) 在每块完成后调用
+    """
+    os.makedirs(path, exist_ok=True)
+    normed = normalize(sparse.csr_matrix(matrix, dtype=np.float32)).astype(np.float32)
+    normed_t = normed.T.tocsr()
+    n = normed.shape[0]
+    meta = {'shape': [n, n], 'tile': tile, 'fingerprint': _matrix_fingerprint(normed)}
+    data_path = os.path.join(path, 'similarity.npy')
+    manifest_path = os.path.join(path, 'manifest.json')
+
+    done = set()
+    manifest = _read_json(manifest_path)
+    if manifest is not None and os.path.exists(data_path) and \
+            {key: manifest.get(key) for key in meta} == meta:
+        done = {tuple(t) for t in manifest['done']}
+        out = np.load(data_path, mmap_mode='r+')
+    else:
+        # 先删除旧文件再新建：其他进程已映射的旧文件不会被截断
+        for stale in (manifest_path, data_path):
+            if os.path.exists(stale):
+                os.remove(stale)
+        out = np.lib.format.open_memmap(data_path, mode='w+', dtype=np.float32, shape=(n, n))
+
+    starts = range(0, n, tile)
+    tiles = [(i, j) for i in starts for j in starts if i <= j and (i, j) not in done]
+    total = len(done) + len(tiles)
+
+    def save_manifest():
+        out.flush()
+        _write_json(manifest_path, {**meta, 'done': sorted(done), 'complete': len(done) == total})
+
+    def compute(i, j):
+        block = (normed[i:i + tile] @ normed_t[:, j:j + tile]).toarray()
+        out[i:i + tile, j:j + tile] = block
+        if i != j:
+            out[j:j + tile, i:i + tile] = block.T
+        return i, j
+
+    pool = ThreadPoolExecutor(max_workers=n_workers or os.cpu_count())
+    try:
+        futures = [pool.submit(compute, i, j) for i, j in tiles]
+        for count, future in enumerate(as_completed(futures), 1):
+            done.add(future.result())
+            if count % checkpoint == 0:
+                save_manifest()
+            if progress is not None:
+                progress(len(done), total)
+    finally:
+        # 中断时取消未开始的块，已完成的块记入 manifest
+        pool.shutdown(cancel_futures=True)
+        save_manifest()
+    del out
+    return np.load(data_path, mmap_mode='r')
+
+def load_similarity(path=SIMILARITY_DIR):
+    """读取 blocked_similarity 算完的相似度（只读内存映射）；不存在或未算完时返回 None"""
+    manifest = _read_json(os.path.join(path, 'manifest.json'))
+    if manifest is None or not manifest.get('complete'):
+        return None
+    return np.load(os.path.join(path, 'similarity.npy'), mmap_mode='r')
+
+def _matrix_fingerprint(matrix):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.asarray(matrix.shape, dtype=np.int64).tobytes())
+    for arr in (matrix.indptr, matrix.indices, matrix.data):
+        h.update(np.ascontiguousarray(arr).tobytes())
+    return h.hexdigest()
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_json(path, obj):
+    """先写临时文件再替换，中断时不会留下半个文件"""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+# ========== 新增：后台重建与原子切换 ==========
+
+class DatasetVersion:
+    """一个构建完成的数据版本：三张表、用户-物品矩阵、数据指纹与模型，构建后不再修改"""
+
+    def __init__(self, version, label, users_df, news_df, behaviors_df, matrix, fingerprint, algorithm, model):
+        self.version = version
+        self.label = label
+        self.users_df = users_df
+        self.news_df = news_df
+        self.behaviors_df = behaviors_df
+        self.matrix = matrix
+        self.fingerprint = fingerprint
+        self.algorithm = algorithm
+        self.model = model
+        self.built_at = time.time()
+
+class _Superseded(Exception):
+    """构建期间提交了更新的请求，放弃当前构建"""
+
+class ModelHolder:
+    """进程级模型持有者：后台线程加载数据并构建矩阵与模型，完成后整体替换当前版本
+
+    双缓冲：构建期间读者继续使用 current 指向的旧版本，新版本建好后一次引用赋值完成切换，
+    已取得旧版本引用的读者不受影响。构建期间再次 submit 时放弃正在进行的构建，只保留最新的请求。
+    给定 model_cache 时模型经由缓存构建，其他算法可复用同一矩阵与指纹
+    """
+
+    def __init__(self, algorithm='user_cf', model_cache=None, **params):
+        self.algorithm = algorithm
+        self.params = params
+        self.model_cache = model_cache
+        self._current = None
+        self._version = 0
+        self._pending = None
+        self._building = False
+        self._status = {'label': None, 'fraction': 0.0, 'message': '', 'error': None}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @property
+    def current(self):
+        """当前版本（DatasetVersion），尚未构建过时为 None"""
+        return self._current
+
+    @property
+    def version(self):
+        current = self._current
+        return 0 if current is None else current.version
+
+    @property
+    def building(self):
+        with self._cond:
+            return self._building or self._pending is not None
+
+    def status(self):
+        """构建进度：label、fraction（0~1）、message、error（上一次构建失败的原因）"""
+        with self._cond:
+            return {**self._status, 'building': self._building or self._pending is not None}
+
+    def submit(self, loader, label=''):
+        """提交一次后台重建，立即返回
+
+        loader(progress) 返回 (users_df, news_df, behaviors_df) 或再加上已构建好的用户-物品矩阵，
+        也可返回 ScenarioSnapshot（带矩阵、指纹与近邻索引）；返回 None 表示没有数据；
+        progress(fraction, message) 报告加载进度
+        """
+        with self._cond:
+            self._pending = (loader, label)
+            self._status = {'label': label, 'fraction': 0.0, 'message': '排队中', 'error': None}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="model-holder", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """等待后台构建全部完成，返回当前版本"""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._building and self._pending is None, timeout)
+        return self._current
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._pending is None:
+                    self._thread = None
+                    self._cond.notify_all()
+                    return
+                (loader, label), self._pending = self._pending, None
+                self._building = True
+            try:
+                self._build(loader, label)
+            finally:
+                with self._cond:
+                    self._building = False
+                    self._cond.notify_all()
+
+    def _report(self, label, fraction, message):
+        with self._cond:
+            if self._pending is not None:
+                raise _Superseded
+            self._status = {'label': label, 'fraction': fraction, 'message': message, 'error': None}
+
+    def _build(self, loader, label):
+        try:
+            # 加载阶段占进度的前 60%
+            data = loader(lambda fraction, message: self._report(label, 0.6 * fraction, message))
+            if data is None:
+                raise FileNotFoundError("未找到数据文件")
+            fingerprint = similarity = None
+            if isinstance(data, ScenarioSnapshot):
+                users_df, news_df, behaviors_df = data.users_df, data.news_df, data.behaviors_df
+                matrix, fingerprint, similarity = data.matrix, data.fingerprint, data.similarity
+            else:
+                users_df, news_df, behaviors_df = data[:3]
+                matrix = data[3] if len(data) > 3 else None
+            if matrix is None:
+                self._report(label, 0.6, "构建用户-物品矩阵")
+                matrix = build_user_item_matrix(users_df, news_df, behaviors_df)
+            if fingerprint is None:
+                self._report(label, 0.7, "计算数据指纹")
+                fingerprint = dataset_fingerprint(users_df, news_df, behaviors_df)
+            self._report(label, 0.75, f"构建{ALGORITHM_NAMES[self.algorithm]}模型")
+            if self.model_cache is not None:
+                model = self.model_cache.get(users_df, news_df, behaviors_df, fingerprint=fingerprint,
+                                             algorithm=self.algorithm, matrix=matrix, similarity=similarity,
+                                             **self.params)
+            else:
+                if similarity is not None and self.algorithm == 'user_cf':
+                    model = build_model(matrix, self.algorithm, similarity=similarity, **self.params)
+                else:
+                    model = build_model(matrix, self.algorithm, **self.params)
+            with self._cond:
+                if self._pending is not None:
+                    raise _Superseded
+                self._version += 1
+                self._current = DatasetVersion(self._version, label, users_df, news_df, behaviors_df,
+                                               matrix, fingerprint, self.algorithm, model)
+                self._status = {'label': label, 'fraction': 1.0, 'message': "完成", 'error': None}
+        except _Superseded:
+            pass
+        except Exception as e:
+            with self._cond:
+                self._status = {'label': label, 'fraction': 0.0, 'message': "失败", 'error': str(e)}
+
+# ========== 新增：场景快照 ==========
+
+# 场景快照目录：每个快照一个子目录，含列式二进制数据集、用户-物品矩阵与用户近邻索引
+SNAPSHOT_DIR = 'scenario_snapshots'
+
+class ScenarioSnapshot:
+    """加载完成的场景快照：三张表与矩阵、近邻数组均为只读内存映射"""
+
+    def __init__(self, path, meta, users_df, news_df, behaviors_df, matrix, similarity):
+        self.path = path
+        self.meta = meta
+        self.fingerprint = meta['fingerprint']
+        self.users_df = users_df
+        self.news_df = news_df
+        self.behaviors_df = behaviors_df
+        self.matrix = matrix
+        self.similarity = similarity
+
+@instrumented()
+def scenario_snapshot(scenario_name, seed=42, n_users=None, n_news=None, n_behaviors=None, k=DEFAULT_NEIGHBORS,
+                      path=SNAPSHOT_DIR, progress=None):
+    """返回场景数据的快照，不存在时生成数据、构建矩阵与近邻索引并保存
+
+    快照按 (场景, 种子, 规模, 近邻数, 生成代码哈希) 区分，先写入临时目录再整体改名，
+    已被其他进程映射的快照不会被改写；同一参数下生成代码变化前的旧快照在新快照保存后删除。
+    progress(fraction, message) 报告进度
+    """
+    report = progress or (lambda fraction, message: None)
+    params = {'scenario': scenario_name, 'seed': seed, 'n_users': n_users, 'n_news': n_news,
+              'n_behaviors': n_behaviors, 'k': k}
+    key = scenario_snapshot_key(**params)
+    target = os.path.join(path, key)
+    if not os.path.exists(os.path.join(target, 'snapshot.json')):
+        report(0.0, "正在生成场景数据...")
+        users_df, news_df, behaviors_df = generate_scenario(scenario_name, seed=seed, n_users=n_users,
+                                                            n_news=n_news, n_behaviors=n_behaviors)
+        report(0.4, "正在构建用户-物品矩阵与近邻索引...")
+        matrix = build_user_item_matrix(users_df, news_df, behaviors_df)
+        neighbors = build_neighbor_index(matrix, k=k)
+        report(0.7, "正在保存场景快照...")
+        _save_snapshot(path, key, params, users_df, news_df, behaviors_df, matrix, neighbors)
+    report(0.9, "正在加载场景快照...")
+    return load_scenario_snapshot(target)
+
+def scenario_snapshot_key(scenario, seed=42, n_users=None, n_news=None, n_behaviors=None, k=DEFAULT_NEIGHBORS):
+    """快照键：参数与生成代码哈希的摘要"""
+    payload = json.dumps([scenario, seed, n_users, n_news, n_behaviors, k, _generator_hash()], ensure_ascii=False)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=12).hexdigest()
+
+@functools.lru_cache(maxsize=1)
+def _generator_hash():
+    """整个模块源码的哈希：数据生成、矩阵与近邻构建、二进制编码、数据指纹等决定快照内容的代码或常量
+    任一变化时快照键随之变化，旧快照自动重建
+    """
+    with open(__file__, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+def load_scenario_snapshot(path):
+    """内存映射加载一个快照目录；目录不完整时返回 None"""
+    meta = _read_json(os.path.join(path, 'snapshot.json'))
+    if meta is None:
+        return None
+    users_df, news_df, behaviors_df = load_dataset_binary(os.path.join(path, 'data'))
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+              for name in ('indptr', 'indices', 'data', 'neighbor_indices', 'neighbor_scores')}
+    matrix = sparse.csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(meta['shape']))
+    catalog = item_catalog(news_df)
+    matrix = _attach_index(matrix, IdIndex(users_df['user_id'].to_numpy()), catalog.index, catalog)
+    similarity = NeighborIndex(arrays['neighbor_indices'], arrays['neighbor_scores'])
+    return ScenarioSnapshot(path, meta, users_df, news_df, behaviors_df, matrix, similarity)
+
+def _save_snapshot(path, key, params, users_df, news_df, behaviors_df, matrix, neighbors):
+    os.makedirs(path, exist_ok=True)
+    tmp = os.path.join(path, f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        save_dataset_binary(users_df, news_df, behaviors_df, os.path.join(tmp, 'data'))
+        for name, values in (('indptr', matrix.indptr), ('indices', matrix.indices), ('data', matrix.data),
+                             ('neighbor_indices', neighbors.indices), ('neighbor_scores', neighbors.scores)):
+            np.save(os.path.join(tmp, f"{name}.npy"), values)
+        # 指纹按加载后的表计算，与之后每次加载快照得到的数据一致
+        loaded = load_dataset_binary(os.path.join(tmp, 'data'))
+        meta = {'params': params, 'generator': _generator_hash(), 'shape': list(matrix.shape),
+                'fingerprint': dataset_fingerprint(*loaded)}
+        del loaded
+        _write_json(os.path.join(tmp, 'snapshot.json'), meta)
+        os.rename(tmp, os.path.join(path, key))
+    except OSError:
+        # 并发保存同一快照时以先完成的为准
+        if not os.path.exists(os.path.join(path, key, 'snapshot.json')):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
 
-def calculate_user_similarity(matrix):
-    return cosine_similarity(matrix)
-
-def recommend_for_user(user_id, similarity, matrix, news_df, top_k=5, top_n=10):
-    u_idx = user_id - 1
-    sims = similarity[u_idx]
-    similar_indices = np.argsort(sims)[::-1][1:top_k+1]
-    similar_users = [(i+1, sims[i]) for i in similar_indices]
-
-    scores = np.zeros(len(news_df))
-    for sim_idx in similar_indices:
-        scores += sims[sim_idx] * matrix[sim_idx]
-
-    user_watched = np.where(matrix[u_idx] > 0)[0]
-    scores[user_watched] = -1
-
-    top_indices = np.argsort(scores)[::-1][:top_n]
-
-    recommendations = []
-    for idx in top_indices:
-        if scores[idx] > 0:
-            news = news_df.iloc[idx]
-            recommender = similar_users[0][0] if similar_users else user_id
-            recommendations.append((
-                news['news_id'],
-                news['title'],
-                news['category'],
-                f"用户{recommender}喜欢此类内容"
-            ))
-
-    return similar_users, recommendations
\ No newline at end of file
+    # 清理同一参数下由旧生成代码产生的快照
+    for name in os.listdir(path):
+        if name == key or name.startswith('.'):
+            continue
+        meta = _read_json(os.path.join(path, name, 'snapshot.json'))
+        if meta is not None and meta['params'] == params and meta['generator'] != _generator_hash():
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)